@@ -0,0 +1,212 @@
+import re
+import csv
+import sqlite3
+import datetime
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
+import counts
+
+# pragmas of the dashboard's read-only connections, the database is mapped
+# into memory so readers share the OS page cache rather than each copying
+# pages into its own cache
+READ_PRAGMAS = {
+  'mmap_size': 1 << 30,
+  'cache_size': -65536,
+  'temp_store': 'MEMORY',
+  'query_only': 1,
+}
+
+# connections and checkouts of each read-only pool
+POOL_STATS = {}
+
+# in WAL mode the dashboard's readers and the pipeline's writer don't block
+# each other. the mode is kept in the database file once set, switching
+# needs the database to itself so while readers hold it a later connection
+# switches instead
+def use_wal(engine):
+  @event.listens_for(engine, 'connect')
+  def connect(dbapi_connection, record):
+    try:
+      dbapi_connection.execute('PRAGMA journal_mode = WAL')
+    except sqlite3.OperationalError:
+      pass
+  return engine
+
+def get_engine(path='mta-aggregate.db'):
+  return use_wal(create_engine(f'sqlite:///{path}'))
+
+# a queue of read-only connections opened with pragmas. streamlit runs
+# every rerun in a new thread, so connections are handed to whichever
+# thread checks one out rather than kept per thread, sqlite's same thread
+# check is off as a connection is only used by one thread at a time. the
+# pipeline rewrites the database while the app runs so it isn't opened
+# immutable
+def read_only_engine(path='mta-aggregate.db', pool_size=8, pragmas=READ_PRAGMAS):
+  engine = create_engine(
+    f'sqlite:///file:{path}?mode=ro&uri=true',
+    connect_args={'check_same_thread': False}, poolclass=QueuePool, pool_size=pool_size
+  )
+  stats = POOL_STATS[engine.pool] = {'connections': 0, 'checkouts': 0}
+
+  @event.listens_for(engine, 'connect')
+  def connect(dbapi_connection, record):
+    stats['connections'] += 1
+    for key, value in pragmas.items():
+      dbapi_connection.execute(f'PRAGMA {key} = {value}')
+
+  @event.listens_for(engine, 'checkout')
+  def checkout(dbapi_connection, record, proxy):
+    stats['checkouts'] += 1
+
+  return engine
+
+def pool_stats(engine):
+  return dict(POOL_STATS.get(engine.pool, {}), status=engine.pool.status())
+
+def create_tables(conn):
+  conn.execute('''
+  CREATE TABLE IF NOT EXISTS station_data (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    lon REAL NOT NULL,
+    lat REAL NOT NULL,
+    type TEXT NOT NULL
+  )
+  ''')
+  conn.execute('''
+  CREATE TABLE IF NOT EXISTS daily_count (
+    station_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    graveyard_entries INTEGER DEFAULT -1,
+    morning_entries INTEGER DEFAULT -1,
+    afternoon_entries INTEGER DEFAULT -1,
+    night_entries INTEGER DEFAULT -1,
+    graveyard_exits INTEGER DEFAULT -1,
+    morning_exits INTEGER DEFAULT -1,
+    afternoon_exits INTEGER DEFAULT -1,
+    night_exits INTEGER DEFAULT -1,
+    PRIMARY KEY (station_id, date)
+  )
+  ''')
+  conn.execute('CREATE INDEX IF NOT EXISTS daily_count_date ON daily_count (date, station_id)')
+
+# rollups of daily_count served to the dashboard, each keyed by what the
+# app filters on. sums include the -1 of days without readings, the same
+# as summing daily_count directly
+ROLLUPS = {
+  'system_daily': ['type TEXT NOT NULL', 'date TEXT NOT NULL', 'weekend INTEGER NOT NULL'],
+  'line_daily': ['line TEXT NOT NULL', 'date TEXT NOT NULL', 'weekend INTEGER NOT NULL'],
+  'station_yearly': ['station_id INTEGER NOT NULL', 'year INTEGER NOT NULL'],
+  'station_monthly': ['station_id INTEGER NOT NULL', 'year INTEGER NOT NULL', 'month INTEGER NOT NULL'],
+}
+
+def create_rollups(conn):
+  for name, keys in ROLLUPS.items():
+    key_columns = [key.split()[0] for key in keys if not key.startswith('weekend')]
+    columns = ',\n    '.join(keys + [f'{column} INTEGER NOT NULL' for column in counts.COLUMNS])
+    conn.execute(f'''
+    CREATE TABLE IF NOT EXISTS {name} (
+      {columns},
+      PRIMARY KEY ({', '.join(key_columns)})
+    )
+    ''')
+
+# lines a station serves, read off the end of its name ("DEKALB AVE-BDNQR")
+def station_lines(name):
+  match = re.search('-([A-Z0-9]*)$', name)
+  return sorted(set(match[1])) if match else []
+
+# station_line holds which stations serve a line, keyed by line first so
+# line views join against it instead of matching station names
+def load_station_lines(conn):
+  conn.execute('''
+  CREATE TABLE IF NOT EXISTS station_line (
+    station_id INTEGER NOT NULL,
+    line TEXT NOT NULL,
+    PRIMARY KEY (line, station_id),
+    FOREIGN KEY(station_id) REFERENCES station_data(id)
+  )
+  ''')
+  conn.execute('delete from station_line')
+  stations = conn.execute('select id, name from station_data').fetchall()
+  conn.exec_driver_sql('insert into station_line values (?, ?)', [(row['id'], line) for row in stations for line in station_lines(row['name'])])
+
+# stamp of the current daily counts, changed whenever the rollups are
+# rebuilt so caches of dashboard results know to drop what they hold
+def bump_data_version(conn):
+  conn.execute('CREATE TABLE IF NOT EXISTS pipeline_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+  conn.exec_driver_sql("insert or replace into pipeline_meta values ('data_version', ?)", (datetime.datetime.now().isoformat(),))
+
+def data_version(conn):
+  if not conn.execute("select 1 from sqlite_master where type = 'table' and name = 'pipeline_meta'").fetchall():
+    return ''
+  row = conn.execute("select value from pipeline_meta where key = 'data_version'").fetchone()
+  return row['value'] if row else ''
+
+# rebuilds every rollup row of the given years from daily_count
+def refresh_rollups(conn, years):
+  create_rollups(conn)
+  load_station_lines(conn)
+
+  sums = ', '.join(f'sum({column})' for column in counts.COLUMNS)
+  weekend = "strftime('%w', d.date) in ('0', '6')"
+  for year in sorted(years):
+    print(f'refreshing rollups for {year}')
+    in_year = f"d.date >= '{year}-01-01' and d.date < '{year + 1}-01-01'"
+    conn.execute(f"delete from system_daily where date >= '{year}-01-01' and date < '{year + 1}-01-01'")
+    conn.execute(f"delete from line_daily where date >= '{year}-01-01' and date < '{year + 1}-01-01'")
+    conn.execute(f'delete from station_yearly where year = {year}')
+    conn.execute(f'delete from station_monthly where year = {year}')
+    conn.execute(f'''insert into system_daily select s.type, d.date, {weekend}, {sums}
+      from daily_count d join station_data s on s.id = d.station_id where {in_year} group by s.type, d.date''')
+    conn.execute(f'''insert into line_daily select l.line, d.date, {weekend}, {sums}
+      from daily_count d join station_line l on l.station_id = d.station_id where {in_year} group by l.line, d.date''')
+    conn.execute(f'''insert into station_yearly select d.station_id, {year}, {sums}
+      from daily_count d where {in_year} group by d.station_id''')
+    conn.execute(f'''insert into station_monthly select d.station_id, {year}, cast(substr(d.date, 6, 2) as integer), {sums}
+      from daily_count d where {in_year} group by d.station_id, substr(d.date, 6, 2)''')
+  bump_data_version(conn)
+
+def daily_years(conn):
+  result = conn.execute("select distinct substr(date, 1, 4) as year from daily_count")
+  return [int(row['year']) for row in result]
+
+# station_data from turnstile.csv, existing stations are kept as they are
+def load_stations(conn):
+  with open('turnstile.csv') as file:
+    rows = [(row['id'], row['name'], row['lon'], row['lat'], row['type']) for row in csv.DictReader(file)]
+  conn.exec_driver_sql('insert or ignore into station_data (id, name, lon, lat, type) values (?, ?, ?, ?, ?)', rows)
+
+# rewrites YYYY/MM/DD dates of databases built before dates were ISO, the
+# rollups of the migrated years have to be rebuilt afterwards. databases
+# that old predate the rollups too, so they are created empty first
+def migrate_dates(conn):
+  create_rollups(conn)
+  for table in ['daily_count', 'system_daily', 'line_daily']:
+    conn.execute(f"update {table} set date = replace(date, '/', '-') where date like '____/__/__'")
+
+def setup(aggregatedb):
+  with aggregatedb.begin() as conn:
+    create_tables(conn)
+    load_stations(conn)
+    load_station_lines(conn)
+
+def station_ids(aggregatedb):
+  return [row['id'] for row in aggregatedb.execute('select id from station_data order by id')]
+
+# dates are stored as ISO text so that year and month filters are plain
+# range predicates the (date, station_id) index and rollup keys can serve
+def format_date(date):
+  return date.isoformat()
+
+# upserts (station_id, date, counts) rows into daily_count in one statement
+def write_counts(conn, rows):
+  if not rows:
+    return
+  columns = ', '.join(['station_id', 'date'] + counts.COLUMNS)
+  params = ', '.join(['?'] * (len(counts.COLUMNS) + 2))
+  updates = ', '.join(f'{column} = excluded.{column}' for column in counts.COLUMNS)
+  conn.exec_driver_sql(
+    f'insert into daily_count ({columns}) values ({params}) on conflict (station_id, date) do update set {updates}',
+    [(station_id, format_date(date)) + tuple(c) for station_id, date, c in rows]
+  )
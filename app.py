@@ -1,27 +1,74 @@
-from attr import define
-import pandas as pd
-from sqlalchemy import create_engine
+import startup
 import streamlit as st
-import altair as alt
-import numpy as np
-import datetime
-import pydeck as pdk
+with startup.timed('import pandas, numpy and sqlalchemy'):
+  import dashboard_data
+  import lod
+  import queries
 
 '# MTA Swipes Viewer'
 
-@st.cache(allow_output_mutation=True)
-def get_connection():
-  return create_engine("sqlite:///mta-aggregate.db")
+with startup.timed('load data'):
+  data = dashboard_data.current_data()
 
-@st.cache
-def query_db(sql: str):
-  # Connect to our file db
-  conn = get_connection()
-  # Execute a command: this creates a new table
-  # Obtain data
-  cur = conn.execute(sql)
-  df = pd.DataFrame(data=cur.fetchall(), columns=cur.keys())
-  return df
+# relative change of a mean against another, a drop is measured against
+# the lower mean so that halving and doubling read -100% and 100%
+def change(mean, other):
+  if mean >= other:
+    return (mean - other) / other
+  return -(other - mean) / mean
+
+# the change of each period's mean between the base selection and each of
+# the others, means is a frame of DashboardData.period_means
+def show_changes(means, base):
+  labels = ['Average Graveyard Change', 'Average Morning Change', 'Average Graveyard Change', 'Average Graveyard Change']
+  base_means = means.loc[base].astype(int)
+  for other in means.index.drop(base):
+    other_means = means.loc[other].astype(int)
+    for label, mean, other_mean in zip(labels, base_means, other_means):
+      st.markdown(f'{label}: **{change(mean, other_mean):.2%}**----{mean}({base}) vs {other_mean}({other})')
+
+# a line per period of a daily table, at the resolution lod picks for the
+# chart's width rather than a point per day
+def line_chart(df, metric):
+  return alt.Chart(lod.downsample(df)).mark_line().encode(
+    x=alt.X('date:T', axis=alt.Axis(title='Date')),
+    y=alt.Y('value:Q', axis=alt.Axis(title=metric)),
+    color='key:N'
+  )
+
+# first and last year of a span to chart, offered from every year the
+# dashboard knows like the year selectors. a year the data has none of
+# charts nothing
+def year_span():
+  years = sorted(queries.YEARS)
+  return st.select_slider('Choose a range of years', years, value=(years[0], years[-1]))
+
+# a column per station of a map payload of DashboardData, its data is
+# handed to the layer as it is
+def station_map(payload, elevation, tooltip):
+  layer = pdk.Layer(
+    "ColumnLayer",
+    data=payload,
+    get_position="[lon, lat]",
+    get_elevation_value=elevation,
+    elevation_scale=1,
+    radius=50,
+    auto_highlight=True,
+    get_fill_color=["red", "green", 0, "qt * 255"],
+    pickable=True,
+    extruded=True,
+  )
+  # Set the viewport location
+  view_state = pdk.ViewState(
+    longitude=-73.987495, latitude=40.75529, zoom=10, min_zoom=5, max_zoom=15, pitch=40.5, bearing=60
+  )
+  # Combined all of it and render a viewport
+  return pdk.Deck(
+    map_style="mapbox://styles/mapbox/light-v9",
+    layers=[layer],
+    initial_view_state=view_state,
+    tooltip={"html": tooltip, "style": {"color": "white"}},
+  )
 
 all_tool = "View All System"
 line_tool = "View by Line"
@@ -35,17 +82,16 @@ selected_tool = st.selectbox('Please select a tool', tools)
 # ALL SYSTEM TOOL
 ############
 if selected_tool == all_tool:
-  system = st.selectbox('Choose a system', ['NYCT', 'PATH', 'TRAM', 'AIRTRAIN'])
-  year = st.selectbox('Choose a year', [2021,2020,2019,2018,2017,2016])
-  metric = st.selectbox('Choose a metric', ['Entries', 'Exits'])
+  with startup.timed('import altair'):
+    import altair as alt
+  with startup.timed('import pydeck'):
+    import pydeck as pdk
+  system = st.selectbox('Choose a system', queries.SYSTEMS)
+  year = st.selectbox('Choose a year', queries.YEARS)
+  metric = st.selectbox('Choose a metric', queries.METRICS)
   if year and system and metric:
     f'### {year} Ridership Table ({metric})'
-    sql_table = f'''select date, sum(graveyard_{metric.lower()}) as graveyard, 
-                    sum(morning_{metric.lower()}) as morning, sum(afternoon_{metric.lower()}) 
-                    as afternoon, sum(night_{metric.lower()}) as night from daily_count 
-                    where date like "{year}%" and station_id in 
-                    (select id from station_data where type = "{system}") group by date'''
-    df = query_db(sql_table)
+    df = data.system_table(system, year, metric)
     g_mean = int(df['graveyard'].mean())
     m_mean = int(df['morning'].mean())
     a_mean = int(df['afternoon'].mean())
@@ -54,69 +100,29 @@ if selected_tool == all_tool:
     f'Average Morning (6 AM - Noon): {m_mean}'
     f'Average Graveyard (Noon - 6 PM): {a_mean}'
     f'Average Graveyard (6 PM - 12 AM): {n_mean}'
-    chart = alt.Chart(df).transform_fold(
-      ['graveyard', 'morning', 'afternoon', 'night']
-    ).mark_line().encode(
-      x=alt.X('yearmonthdate(date):O', axis=alt.Axis(title='Date')),
-      y=alt.Y('value:Q', axis=alt.Axis(title=metric)),
-      color='key:N'
-    )
-    st.altair_chart(chart, use_container_width=True)
+    st.altair_chart(line_chart(df, metric), use_container_width=True)
 
     f'### {year} Ridership Map ({metric})'
-    map_table = f'''select id, graveyard + morning + afternoon + night as total, name, lon, lat
-                    from (select station_id, sum(graveyard_{metric.lower()}) as graveyard, 
-                    sum(morning_{metric.lower()}) as morning, sum(afternoon_{metric.lower()}) 
-                    as afternoon, sum(night_{metric.lower()}) as night from daily_count 
-                    where date like "{year}%" and station_id in 
-                    (select id from station_data where type = "{system}")
-                    group by station_id)
-                    inner join station_data on station_data.id = station_id'''
-    map_df = query_db(map_table).copy()
-    map_df['qt'] = map_df.total.rank(pct = True)
-    map_df['red'] = np.where(map_df['qt']<= 0.5, map_df['qt'] * 2 * 255, 255)
-    map_df['green'] = np.where(map_df['qt']<= 0.5, 255, (1 - map_df['qt']) * 2 * 255)
-    map_df['elevation'] = map_df['total'] - map_df['total'].min()
-    layer = pdk.Layer(
-      "ColumnLayer",
-      data=map_df,
-      get_position="[lon, lat]",
-      get_elevation_value="elevation",
-      elevation_scale=1,
-      radius=50,
-      auto_highlight=True,
-      get_fill_color=["red", "green", 0, "qt * 255"],
-      elevation_range=[map_df.total.min, map_df.total.max],
-      pickable=True,
-      extruded=True,
-    )
-    # Set the viewport location
-    view_state = pdk.ViewState(
-      longitude=-73.987495, latitude=40.75529, zoom=10, min_zoom=5, max_zoom=15, pitch=40.5, bearing=60
-    )
-    # Combined all of it and render a viewport
-    r = pdk.Deck(
-      map_style="mapbox://styles/mapbox/light-v9",
-      layers=[layer],
-      initial_view_state=view_state,
-      tooltip={"html": "<b>{name}</b><br>Total metric {total}", "style": {"color": "white"}},
-    )
-    st.pydeck_chart(r)
+    payload = data.map_payload('system', system, year, 0, metric)
+    st.pydeck_chart(station_map(payload, 'elevation', '<b>{name}</b><br>Total metric {total}'))
 
+    first, last = year_span()
+    f'### {first} - {last} Ridership ({metric})'
+    df_years = data.system_years_table(system, range(first, last + 1), metric)
+    st.altair_chart(line_chart(df_years, metric), use_container_width=True)
 
     month_filter = 'Filter by Month'
     week_filter = 'Filter by Weekday/Weekend'
     filter_tool = st.selectbox('Choose a filter', [month_filter, week_filter])
     if filter_tool == month_filter:
       ## FILTERING BY MONTH
-      months = {'01':'January','02':'February','03':'March','04':'April','05':'May','06':'June','07':'July','08':'August','09':'September','10':'October','11':'November','12':'December'}
+      months = queries.MONTHS
       def format_func(option):
         return months[option]
       month = st.selectbox('Choose a month', options=list(months.keys()), format_func=format_func)
       if month:
         f'### {format_func(month)} Ridership Table ({metric})'
-        sql_table_month = f'select date, sum(graveyard_{metric.lower()}) as graveyard, sum(morning_{metric.lower()}) as morning, sum(afternoon_{metric.lower()}) as afternoon, sum(night_{metric.lower()}) as night from daily_count where date like "{year}/{month}%" and station_id in (select id from station_data where type = "{system}") group by date'
-        df_month = query_db(sql_table_month)
+        df_month = data.system_month_table(system, year, month, metric)
         g_mean_month = int(df_month['graveyard'].mean())
         m_mean_month = int(df_month['morning'].mean())
         a_mean_month = int(df_month['afternoon'].mean())
@@ -125,58 +131,13 @@ if selected_tool == all_tool:
         f'Average Morning (6 AM - Noon): {m_mean_month}'
         f'Average Graveyard (Noon - 6 PM): {a_mean_month}'
         f'Average Graveyard (6 PM - 12 AM): {n_mean_month}'
-        chart = alt.Chart(df_month).transform_fold(
-          ['graveyard', 'morning', 'afternoon', 'night']
-        ).mark_line().encode(
-          x=alt.X('yearmonthdate(date):O', axis=alt.Axis(title='Date')),
-          y=alt.Y('value:Q', axis=alt.Axis(title=metric)),
-          color='key:N'
-        )
-        st.altair_chart(chart, use_container_width=True)
+        st.altair_chart(line_chart(df_month, metric), use_container_width=True)
         f'### {format_func(month)} Ridership Map ({metric})'
-        map_table_month = f'''select id, graveyard + morning + afternoon + night as total, name, lon, lat
-                        from (select station_id, sum(graveyard_{metric.lower()}) as graveyard, 
-                        sum(morning_{metric.lower()}) as morning, sum(afternoon_{metric.lower()}) 
-                        as afternoon, sum(night_{metric.lower()}) as night from daily_count 
-                        where date like "{year}/{month}%" and station_id in 
-                        (select id from station_data where type = "{system}")
-                        group by station_id)
-                        inner join station_data on station_data.id = station_id'''
-        map_df_month = query_db(map_table_month).copy()
-        map_df_month['qt'] = map_df_month.total.rank(pct = True)
-        map_df_month['red'] = np.where(map_df_month['qt']<= 0.5, map_df_month['qt'] * 2 * 255, 255)
-        map_df_month['green'] = np.where(map_df_month['qt']<= 0.5, 255, (1 - map_df_month['qt']) * 2 * 255)
-        map_df_month['elevation'] = map_df_month['total'] - map_df_month['total'].min()
-        layer = pdk.Layer(
-          "ColumnLayer",
-          data=map_df_month,
-          get_position="[lon, lat]",
-          get_elevation_value="elevation",
-          elevation_scale=1,
-          radius=50,
-          auto_highlight=True,
-          get_fill_color=["red", "green", 0, "qt * 255"],
-          elevation_range=[map_df_month.total.min, map_df_month.total.max],
-          pickable=True,
-          extruded=True,
-        )
-        # Set the viewport location
-        view_state = pdk.ViewState(
-          longitude=-73.987495, latitude=40.75529, zoom=10, min_zoom=5, max_zoom=15, pitch=40.5, bearing=60
-        )
-        # Combined all of it and render a viewport
-        r = pdk.Deck(
-          map_style="mapbox://styles/mapbox/light-v9",
-          layers=[layer],
-          initial_view_state=view_state,
-          tooltip={"html": "<b>{name}</b><br>Total montly metric {total}", "style": {"color": "white"}},
-        )
-        st.pydeck_chart(r)
+        payload = data.map_payload('system', system, year, month, metric)
+        st.pydeck_chart(station_map(payload, 'elevation', '<b>{name}</b><br>Total montly metric {total}'))
     if filter_tool == week_filter:
       dayofweek = st.selectbox('Choose a filter', ['Weekday', 'Weekend'])
-      dates = pd.to_datetime(df['date'], format="%Y/%m/%d")
       df_weekday = df.copy()
-      df_weekday["weekend"] = dates.dt.dayofweek > 4
       f'### {dayofweek} Ridership Table ({metric})'
       if dayofweek == 'Weekday':
         df_weekday = df_weekday[df_weekday["weekend"] == False]
@@ -191,28 +152,22 @@ if selected_tool == all_tool:
       f'Average Morning (6 AM - Noon): {m_mean_week}'
       f'Average Graveyard (Noon - 6 PM): {a_mean_week}'
       f'Average Graveyard (6 PM - 12 AM): {n_mean_week}'
-      chart = alt.Chart(df_weekday).transform_fold(
-        ['graveyard', 'morning', 'afternoon', 'night']
-      ).mark_line().encode(
-        x=alt.X('yearmonthdate(date):O', axis=alt.Axis(title='Date')),
-        y=alt.Y('value:Q', axis=alt.Axis(title=metric)),
-        color='key:N'
-      )
-      st.altair_chart(chart, use_container_width=True)
+      st.altair_chart(line_chart(df_weekday, metric), use_container_width=True)
 
 ############
 # VIEW BY LINE
 ############
 if selected_tool == line_tool:
-  year = st.selectbox('Choose a year', [2021,2020,2019,2018,2017,2016])
-  metric = st.selectbox('Choose a metric', ['Entries', 'Exits'])
-  line = st.selectbox('Choose a line', ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'J', 'L', 'M', 'N', 'Q', 'R', 'S', 'Z', '1', '2', '3', '4', '5', '6', '7'])
+  with startup.timed('import altair'):
+    import altair as alt
+  with startup.timed('import pydeck'):
+    import pydeck as pdk
+  year = st.selectbox('Choose a year', queries.YEARS)
+  metric = st.selectbox('Choose a metric', queries.METRICS)
+  line = st.selectbox('Choose a line', queries.LINES)
   if year and metric and line:
     ## extract line data from station name
-    sql_table = f'''select date, sum(graveyard_{metric.lower()}) as graveyard, sum(morning_{metric.lower()}) as morning, 
-                    sum(afternoon_{metric.lower()}) as afternoon, sum(night_{metric.lower()}) as night from daily_count 
-                    where date like "{year}%" and station_id in (select id from station_data where name REGEXP "-[A-Z0-9]*{line}[A-Z0-9]*$") group by date'''
-    df = query_db(sql_table)
+    df = data.line_table(line, year, metric)
     f'### {line} Ridership Table ({metric})'
     g_mean = int(df['graveyard'].mean())
     m_mean = int(df['morning'].mean())
@@ -222,69 +177,29 @@ if selected_tool == line_tool:
     f'Average Morning (6 AM - Noon): {m_mean}'
     f'Average Graveyard (Noon - 6 PM): {a_mean}'
     f'Average Graveyard (6 PM - 12 AM): {n_mean}'
-    chart = alt.Chart(df).transform_fold(
-      ['graveyard', 'morning', 'afternoon', 'night']
-    ).mark_line().encode(
-      x=alt.X('yearmonthdate(date):O', axis=alt.Axis(title='Date')),
-      y=alt.Y('value:Q', axis=alt.Axis(title=metric)),
-      color='key:N'
-    )
-    st.altair_chart(chart, use_container_width=True)
-    map_table_line = f'''select id, graveyard + morning + afternoon + night as total, name, lon, lat
-                        from (select station_id, sum(graveyard_{metric.lower()}) as graveyard, 
-                        sum(morning_{metric.lower()}) as morning, sum(afternoon_{metric.lower()}) 
-                        as afternoon, sum(night_{metric.lower()}) as night from daily_count 
-                        where date like "{year}%" and station_id in 
-                        (select id from station_data where name REGEXP "-[A-Z0-9]*{line}[A-Z0-9]*$")
-                        group by station_id)
-                        inner join station_data on station_data.id = station_id'''
-    map_df_line = query_db(map_table_line).copy()
-    map_df_line['qt'] = map_df_line.total.rank(pct = True)
-    map_df_line['red'] = np.where(map_df_line['qt']<= 0.5, map_df_line['qt'] * 2 * 255, 255)
-    map_df_line['green'] = np.where(map_df_line['qt']<= 0.5, 255, (1 - map_df_line['qt']) * 2 * 255)
-    map_df_line['elevation'] = map_df_line['total'] - map_df_line['total'].min()
-    layer = pdk.Layer(
-      "ColumnLayer",
-      data=map_df_line,
-      get_position="[lon, lat]",
-      get_elevation_value="total",
-      elevation_scale=1,
-      radius=50,
-      auto_highlight=True,
-      get_fill_color=["red", "green", 0, "qt * 255"],
-      elevation_range=[map_df_line.total.min, map_df_line.total.max],
-      pickable=True,
-      extruded=True,
-    )
-    # Set the viewport location
-    view_state = pdk.ViewState(
-      longitude=-73.987495, latitude=40.75529, zoom=10, min_zoom=5, max_zoom=15, pitch=40.5, bearing=60
-    )
-    # Combined all of it and render a viewport
-    r = pdk.Deck(
-      map_style="mapbox://styles/mapbox/light-v9",
-      layers=[layer],
-      initial_view_state=view_state,
-      tooltip={"html": "<b>{name}</b><br>Total metric {total}", "style": {"color": "white"}},
-    )
-    st.pydeck_chart(r)
+    st.altair_chart(line_chart(df, metric), use_container_width=True)
+    payload = data.map_payload('line', line, year, 0, metric)
+    st.pydeck_chart(station_map(payload, 'total', '<b>{name}</b><br>Total metric {total}'))
+
+    first, last = year_span()
+    f'### {line} {first} - {last} Ridership ({metric})'
+    df_years = data.line_years_table(line, range(first, last + 1), metric)
+    st.altair_chart(line_chart(df_years, metric), use_container_width=True)
 
 ############
 # VIEW BY STATION
 ############
 if selected_tool == station_tool:
-  system = st.selectbox('Choose a system', ['NYCT', 'PATH', 'TRAM', 'AIRTRAIN'])
-  year = st.selectbox('Choose a year', [2021,2020,2019,2018,2017,2016])
-  metric = st.selectbox('Choose a metric', ['Entries', 'Exits'])
+  with startup.timed('import altair'):
+    import altair as alt
+  system = st.selectbox('Choose a system', queries.SYSTEMS)
+  year = st.selectbox('Choose a year', queries.YEARS)
+  metric = st.selectbox('Choose a metric', queries.METRICS)
   if system and year and metric:
-    station_table = f'''select name from station_data where type = "{system}"'''
-    station_names = query_db(station_table)['name'].tolist()
+    station_names = data.station_names(system)
     station_selection = st.selectbox('Choose a station', station_names)
     if station_selection:
-      sql_table = f'''select date, sum(graveyard_{metric.lower()}) as graveyard, sum(morning_{metric.lower()}) as morning, 
-                    sum(afternoon_{metric.lower()}) as afternoon, sum(night_{metric.lower()}) as night from daily_count 
-                    where date like "{year}%" and station_id in (select id from station_data where name = "{station_selection}") group by date'''
-      df = query_db(sql_table)
+      df = data.station_table(station_selection, year, metric)
       f'### {station_selection} Ridership Table ({metric})'
       g_mean = int(df['graveyard'].mean())
       m_mean = int(df['morning'].mean())
@@ -294,14 +209,12 @@ if selected_tool == station_tool:
       f'Average Morning (6 AM - Noon): {m_mean}'
       f'Average Graveyard (Noon - 6 PM): {a_mean}'
       f'Average Graveyard (6 PM - 12 AM): {n_mean}'
-      chart = alt.Chart(df).transform_fold(
-        ['graveyard', 'morning', 'afternoon', 'night']
-      ).mark_line().encode(
-        x=alt.X('yearmonthdate(date):O', axis=alt.Axis(title='Date')),
-        y=alt.Y('value:Q', axis=alt.Axis(title=metric)),
-        color='key:N'
-      )
-      st.altair_chart(chart, use_container_width=True)
+      st.altair_chart(line_chart(df, metric), use_container_width=True)
+
+      first, last = year_span()
+      f'### {station_selection} {first} - {last} Ridership ({metric})'
+      df_years = data.station_years_table(station_selection, range(first, last + 1), metric)
+      st.altair_chart(line_chart(df_years, metric), use_container_width=True)
 
 ############
 # COMPARISON TOOL
@@ -313,146 +226,47 @@ if selected_tool == comparison_tool:
   comparison_methods = [by_year, by_line, by_station]
   select_comparison = st.selectbox('Please select a comparison method', comparison_methods)
   if select_comparison == by_year:
-    system = st.selectbox('Choose a system', ['NYCT', 'PATH', 'TRAM', 'AIRTRAIN'])
-    metric = st.selectbox('Choose a metric', ['Entries', 'Exits'])
-    list_years = [2021,2020,2019,2018,2017,2016]
+    system = st.selectbox('Choose a system', queries.SYSTEMS)
+    metric = st.selectbox('Choose a metric', queries.METRICS)
+    list_years = queries.YEARS
     year1 = st.selectbox('Choose a year', list_years)
     if year1 and system and metric:
       list_years2 = list_years.copy()
       list_years2.remove(year1)
-      year2 = st.selectbox('Choose a year to compare with', list_years2)
-
-      if year2:
-        year1_sql = f'''select date, sum(graveyard_{metric.lower()}) as graveyard, 
-          sum(morning_{metric.lower()}) as morning, sum(afternoon_{metric.lower()}) 
-          as afternoon, sum(night_{metric.lower()}) as night from daily_count 
-          where date like "{year1}%" and station_id in 
-          (select id from station_data where type = "{system}") group by date'''
-        year2_sql = f'''select date, sum(graveyard_{metric.lower()}) as graveyard, 
-          sum(morning_{metric.lower()}) as morning, sum(afternoon_{metric.lower()}) 
-          as afternoon, sum(night_{metric.lower()}) as night from daily_count 
-          where date like "{year2}%" and station_id in 
-          (select id from station_data where type = "{system}") group by date'''
-        
-        df1 = query_db(year1_sql)
-        df2 = query_db(year2_sql)
-
-        g1_mean = int(df1['graveyard'].mean())
-        m1_mean = int(df1['morning'].mean())
-        a1_mean = int(df1['afternoon'].mean())
-        n1_mean = int(df1['night'].mean())
-        g2_mean = int(df2['graveyard'].mean())
-        m2_mean = int(df2['morning'].mean())
-        a2_mean = int(df2['afternoon'].mean())
-        n2_mean = int(df2['night'].mean())
-
-        g_change = (g1_mean - g2_mean) / g2_mean
-        if g_change < 0:
-          g_change = ((g2_mean - g1_mean) / g1_mean) * -1
-        m_change = (m1_mean - m2_mean) / m2_mean
-        if m_change < 0:
-          m_change = ((m2_mean - m1_mean) / m1_mean) * -1
-        a_change = (a1_mean - a2_mean) / a2_mean
-        if a_change < 0:
-          a_change = ((a2_mean - a1_mean) / a1_mean) * -1
-        n_change = (n1_mean - n2_mean) / n2_mean
-        if n_change < 0:
-          n_change = ((n2_mean - n1_mean) / n1_mean) * -1
-        f'Average Graveyard Change: **{g_change:.2%}**----{g1_mean}({year1}) vs {g2_mean}({year2})'
-        f'Average Morning Change: **{m_change:.2%}**----{m1_mean}({year1}) vs {m2_mean}({year2})'
-        f'Average Graveyard Change: **{a_change:.2%}**----{a1_mean}({year1}) vs {a2_mean}({year2})'
-        f'Average Graveyard Change: **{n_change:.2%}**----{n1_mean}({year1}) vs {n2_mean}({year2})'
+      years = st.multiselect('Choose years to compare with', list_years2, default=list_years2[:1])
+      if years:
+        station_ids = data.system_ids(system)
+        means = data.period_means({year: (year, station_ids) for year in [year1] + years}, metric)
+        show_changes(means, year1)
   if select_comparison == by_line:
-    year = st.selectbox('Choose a year', [2021,2020,2019,2018,2017,2016])
-    metric = st.selectbox('Choose a metric', ['Entries', 'Exits'])
-    list_lines = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'J', 'L', 'M', 'N', 'Q', 'R', 'S', 'Z', '1', '2', '3', '4', '5', '6', '7']
+    year = st.selectbox('Choose a year', queries.YEARS)
+    metric = st.selectbox('Choose a metric', queries.METRICS)
+    list_lines = queries.LINES
     line1 = st.selectbox('Choose a line', list_lines)
     if line1 and year and metric:
       list_lines2 = list_lines.copy()
       list_lines2.remove(line1)
-      line2 = st.selectbox('Choose a line to compare with', list_lines2)
-      if line2:
-        line1_sql = f'''select date, sum(graveyard_{metric.lower()}) as graveyard, sum(morning_{metric.lower()}) as morning, 
-                        sum(afternoon_{metric.lower()}) as afternoon, sum(night_{metric.lower()}) as night from daily_count 
-                        where date like "{year}%" and station_id in (select id from station_data where name REGEXP "-[A-Z0-9]*{line1}[A-Z0-9]*$") group by date'''
-        line2_sql = f'''select date, sum(graveyard_{metric.lower()}) as graveyard, sum(morning_{metric.lower()}) as morning, 
-                        sum(afternoon_{metric.lower()}) as afternoon, sum(night_{metric.lower()}) as night from daily_count 
-                        where date like "{year}%" and station_id in (select id from station_data where name REGEXP "-[A-Z0-9]*{line2}[A-Z0-9]*$") group by date'''
-
-        df1 = query_db(line1_sql)
-        df2 = query_db(line2_sql)
-
-        g1_mean = int(df1['graveyard'].mean())
-        m1_mean = int(df1['morning'].mean())
-        a1_mean = int(df1['afternoon'].mean())
-        n1_mean = int(df1['night'].mean())
-        g2_mean = int(df2['graveyard'].mean())
-        m2_mean = int(df2['morning'].mean())
-        a2_mean = int(df2['afternoon'].mean())
-        n2_mean = int(df2['night'].mean())
-
-        g_change = (g1_mean - g2_mean) / g2_mean
-        if g_change < 0:
-          g_change = ((g2_mean - g1_mean) / g1_mean) * -1
-        m_change = (m1_mean - m2_mean) / m2_mean
-        if m_change < 0:
-          m_change = ((m2_mean - m1_mean) / m1_mean) * -1
-        a_change = (a1_mean - a2_mean) / a2_mean
-        if a_change < 0:
-          a_change = ((a2_mean - a1_mean) / a1_mean) * -1
-        n_change = (n1_mean - n2_mean) / n2_mean
-        if n_change < 0:
-          n_change = ((n2_mean - n1_mean) / n1_mean) * -1
-        f'Average Graveyard Change: **{g_change:.2%}**----{g1_mean}({line1}) vs {g2_mean}({line2})'
-        f'Average Morning Change: **{m_change:.2%}**----{m1_mean}({line1}) vs {m2_mean}({line2})'
-        f'Average Graveyard Change: **{a_change:.2%}**----{a1_mean}({line1}) vs {a2_mean}({line2})'
-        f'Average Graveyard Change: **{n_change:.2%}**----{n1_mean}({line1}) vs {n2_mean}({line2})'
+      lines = st.multiselect('Choose lines to compare with', list_lines2, default=list_lines2[:1])
+      if lines:
+        means = data.period_means({line: (year, data.line_ids(line)) for line in [line1] + lines}, metric)
+        show_changes(means, line1)
   if select_comparison == by_station:
-    system = st.selectbox('Choose a system', ['NYCT', 'PATH', 'TRAM', 'AIRTRAIN'])
-    year = st.selectbox('Choose a year', [2021,2020,2019,2018,2017,2016])
-    metric = st.selectbox('Choose a metric', ['Entries', 'Exits'])
+    system = st.selectbox('Choose a system', queries.SYSTEMS)
+    year = st.selectbox('Choose a year', queries.YEARS)
+    metric = st.selectbox('Choose a metric', queries.METRICS)
     if system and year and metric:
-      station_table = f'''select name from station_data where type = "{system}"'''
-      station_names = query_db(station_table)['name'].tolist()
+      station_names = data.station_names(system)
       station_selection = st.selectbox('Choose a station', station_names)
       if station_selection:
         station_names2 = station_names.copy()
         station_names2.remove(station_selection)
-        station_selection2 = st.selectbox('Choose a station to compare with', station_names2)
-        if station_selection2:
-          station1 = f'''select date, sum(graveyard_{metric.lower()}) as graveyard, sum(morning_{metric.lower()}) as morning, 
-                    sum(afternoon_{metric.lower()}) as afternoon, sum(night_{metric.lower()}) as night from daily_count 
-                    where date like "{year}%" and station_id in (select id from station_data where name = "{station_selection}") group by date'''
-          station2 = f'''select date, sum(graveyard_{metric.lower()}) as graveyard, sum(morning_{metric.lower()}) as morning, 
-                    sum(afternoon_{metric.lower()}) as afternoon, sum(night_{metric.lower()}) as night from daily_count 
-                    where date like "{year}%" and station_id in (select id from station_data where name = "{station_selection2}") group by date'''
-          df1 = query_db(station1)
-          df2 = query_db(station2)
-
-          g1_mean = int(df1['graveyard'].mean())
-          m1_mean = int(df1['morning'].mean())
-          a1_mean = int(df1['afternoon'].mean())
-          n1_mean = int(df1['night'].mean())
-          g2_mean = int(df2['graveyard'].mean())
-          m2_mean = int(df2['morning'].mean())
-          a2_mean = int(df2['afternoon'].mean())
-          n2_mean = int(df2['night'].mean())
-
-          g_change = (g1_mean - g2_mean) / g2_mean
-          if g_change < 0:
-            g_change = ((g2_mean - g1_mean) / g1_mean) * -1
-          m_change = (m1_mean - m2_mean) / m2_mean
-          if m_change < 0:
-            m_change = ((m2_mean - m1_mean) / m1_mean) * -1
-          a_change = (a1_mean - a2_mean) / a2_mean
-          if a_change < 0:
-            a_change = ((a2_mean - a1_mean) / a1_mean) * -1
-          n_change = (n1_mean - n2_mean) / n2_mean
-          if n_change < 0:
-            n_change = ((n2_mean - n1_mean) / n1_mean) * -1
-          f'Average Graveyard Change: **{g_change:.2%}**----{g1_mean}({station_selection}) vs {g2_mean}({station_selection2})'
-          f'Average Morning Change: **{m_change:.2%}**----{m1_mean}({station_selection}) vs {m2_mean}({station_selection2})'
-          f'Average Graveyard Change: **{a_change:.2%}**----{a1_mean}({station_selection}) vs {a2_mean}({station_selection2})'
-          f'Average Graveyard Change: **{n_change:.2%}**----{n1_mean}({station_selection}) vs {n2_mean}({station_selection2})'
+        stations = st.multiselect('Choose stations to compare with', station_names2, default=station_names2[:1])
+        if stations:
+          means = data.period_means({name: (year, data.station_ids(name)) for name in [station_selection] + stations}, metric)
+          show_changes(means, station_selection)
 
+with st.sidebar.expander('Startup time'):
+  st.text(startup.report())
 
+with st.sidebar.expander('Connection pool'):
+  st.json(dashboard_data.pool_stats())
@@ -0,0 +1,65 @@
+import os
+import pyarrow as pa
+import pandas as pd
+import aggregate
+import dashboard_data
+import queries
+
+ARROW_DIR = 'mta-arrow/'
+
+# tables exported split by year, the dated ones in the order given. the
+# rollups are exported next to the daily counts for other readers
+DATED = {'daily_count': 'date, station_id', 'system_daily': 'type, date', 'line_daily': 'line, date'}
+YEARLY = ['station_yearly', 'station_monthly']
+
+def path(name, year=None, directory=ARROW_DIR):
+  return os.path.join(directory, name, f'{year}.arrow') if year is not None else os.path.join(directory, f'{name}.arrow')
+
+# arrow ipc files are written uncompressed so readers can memory map them,
+# a file is replaced in one rename so a reader never sees half of it
+def write_table(df, filename):
+  os.makedirs(os.path.dirname(filename), exist_ok=True)
+  table = pa.Table.from_pandas(df, preserve_index=False)
+  with pa.OSFile(filename + '.tmp', 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+    writer.write_table(table)
+  os.replace(filename + '.tmp', filename)
+
+# the table's buffers are pages of the file, shared by every process that
+# maps it
+def read_table(filename):
+  return pa.ipc.open_file(pa.memory_map(filename)).read_all()
+
+def year_frame(engine, name, year):
+  if name in DATED:
+    df = queries.query_frame(engine, f"select * from {name} where date >= '{year}-01-01' and date < '{year + 1}-01-01' order by {DATED[name]}")
+    return df.assign(date=pd.to_datetime(df['date'], format='%Y-%m-%d').astype('datetime64[s]'))
+  return queries.query_frame(engine, f'select * from {name} where year = {year}')
+
+# writes the station tables and the daily counts and rollups of the given
+# years, then every station map of those years computed from the written
+# counts, and stamps the export with the data version it holds
+def export(engine, years, directory=ARROW_DIR):
+  write_table(queries.query_frame(engine, queries.STATIONS), path('station_data', directory=directory))
+  write_table(queries.query_frame(engine, queries.STATION_LINES), path('station_line', directory=directory))
+  for year in sorted(years):
+    print(f'exporting {year} to {directory}')
+    for name in list(DATED) + YEARLY:
+      write_table(year_frame(engine, name, year), path(name, year, directory))
+  data = dashboard_data.DashboardData.from_arrow(directory)
+  for year in sorted(years):
+    print(f'exporting {year} station maps to {directory}')
+    write_table(data.map_table(year), path('station_map', year, directory))
+  with open(os.path.join(directory, 'version'), 'w') as file:
+    file.write(aggregate.data_version(engine))
+
+def exported_version(directory=ARROW_DIR):
+  try:
+    with open(os.path.join(directory, 'version')) as file:
+      return file.read()
+  except FileNotFoundError:
+    return None
+
+def exported_years(name, directory=ARROW_DIR):
+  if not os.path.isdir(os.path.join(directory, name)):
+    return []
+  return sorted(int(filename[:-len('.arrow')]) for filename in os.listdir(os.path.join(directory, name)) if filename.endswith('.arrow'))
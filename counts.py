@@ -0,0 +1,256 @@
+import datetime
+import itertools
+import multiprocessing
+from zoneinfo import ZoneInfo
+import numpy as np
+from sqlalchemy import create_engine
+import ingest
+
+#daily count is split into 4 times
+# graveyard - 12 AM to 6 AM (not guaranteed to be within that day)
+# morning - 6 AM to 12 PM
+# afternoon - 12 PM to 6 PM
+# night - 6 PM to 11:59 PM (not guaranteed to be within that day)
+PERIODS = ['graveyard', 'morning', 'afternoon', 'night']
+COLUMNS = [f'{period}_entries' for period in PERIODS] + [f'{period}_exits' for period in PERIODS]
+MISSING = (-1,) * len(COLUMNS)
+
+# readings up to 2 hours either side of a day are used for its boundaries
+GRACE = 7200
+QUARTER = 21600
+
+TIMEZONE = ZoneInfo(ingest.TIMEZONE)
+
+def midnight(date):
+  return int(datetime.datetime(date.year, date.month, date.day, tzinfo=TIMEZONE).timestamp())
+
+# unix range of readings considered for a day
+def day_window(date):
+  return midnight(date) - GRACE, midnight(date + datetime.timedelta(days=1)) + GRACE
+
+def day_range(start, end):
+  current = start
+  while current <= end:
+    yield current
+    current += datetime.timedelta(days=1)
+
+# midnight, 6am, noon, 6pm and the next midnight, one row per midnight
+def boundaries(am0):
+  return np.asarray(am0)[..., None] + QUARTER * np.arange(5)
+
+# index of the reading closest to each target, one row of targets per
+# [start, end) slice of the readings. keys must be sorted over the whole
+# array and order like the timestamps within a slice, a tie goes to the
+# earlier reading
+def closest_in_slices(timestamps, keys, starts, ends, targets, target_keys):
+  first = starts[:, None]
+  last = ends[:, None] - 1
+  right = np.clip(np.searchsorted(keys, target_keys), first, last)
+  left = np.clip(right - 1, first, last)
+  take_left = np.abs(targets - timestamps[left]) <= np.abs(timestamps[right] - targets)
+  return np.where(take_left, left, right)
+
+# (slices, 8) array of entries then exits deltas for the four periods
+# between the picked boundary readings of each slice
+def period_counts(entries, exits, picks):
+  return np.concatenate((np.diff(entries[picks], axis=1), np.diff(exits[picks], axis=1)), axis=1)
+
+# a turnstile can't let more than about one person a second through, an
+# increment beyond that since the previous reading is a counter jump
+MAX_RATE = 1
+# below MAX_RATE an increment is a jump when its rate is more than
+# OUTLIER_MADS scaled median absolute deviations above the median rate of
+# its pool, every increment of a station's turnstiles on the same day, a
+# sample of tens to hundreds of readings. rates under OUTLIER_RATE are
+# never jumps, so a real surge at a quiet station after a game or a
+# concert, a few thousand an interval, is kept
+OUTLIER_MADS = 10
+OUTLIER_RATE = MAX_RATE / 4
+
+# median of the values of each of n groups, nan for groups without any
+def group_medians(values, group, n):
+  order = np.lexsort((values, group))
+  values = values[order]
+  starts = np.searchsorted(group[order], np.arange(n))
+  ends = np.searchsorted(group[order], np.arange(n), 'right')
+  last = max(len(values) - 1, 0)
+  low = values[np.clip(starts + (ends - starts - 1) // 2, 0, last)] if len(values) else np.zeros(n)
+  high = values[np.clip(starts + (ends - starts) // 2, 0, last)] if len(values) else np.zeros(n)
+  return np.where(ends > starts, (low + high) / 2, np.nan)
+
+# per reading increments of a counter within each slice, the first reading
+# of a slice has none. counters that mostly count down are flipped, resets
+# and rollovers (negative increments) and counter jumps count as 0. pools
+# holds the pool of each slice the outlier cut is computed over
+def counter_increments(values, timestamps, group, starts, pools):
+  increments = np.diff(values, prepend=values[:1])
+  increments[starts] = 0
+  elapsed = np.diff(timestamps, prepend=timestamps[:1])
+
+  backwards = np.bincount(group, increments < 0, len(starts)) > np.bincount(group, increments > 0, len(starts))
+  increments = np.where(backwards[group], -increments, increments)
+  increments[increments < 0] = 0
+  increments[increments > elapsed * MAX_RATE] = 0
+
+  measured = elapsed > 0
+  measured[starts] = False
+  rates = increments[measured] / elapsed[measured]
+  pool = pools[group][measured]
+  count = int(pools.max()) + 1 if len(pools) else 0
+  median = group_medians(rates, pool, count)
+  mad = 1.4826 * group_medians(np.abs(rates - median[pool]), pool, count)
+  limit = np.maximum(median + OUTLIER_MADS * mad, OUTLIER_RATE)
+  jumps = np.zeros(len(increments), dtype=bool)
+  jumps[measured] = rates > limit[pool]
+  increments[jumps] = 0
+  return increments
+
+# (slices, 8) period counts for readings split into contiguous [start, end)
+# slices that each start at the matching am0, pools numbers the station
+# day of each slice. counters are replaced by the running sum of their
+# cleaned increments before the boundary readings are differenced, so a
+# reset inside a period only loses the readings around it
+def slice_counts(timestamps, entries, exits, starts, ends, am0, pools):
+  group = np.repeat(np.arange(len(starts)), ends - starts)
+  # offset each slice's timestamps so the keys sort across slices
+  base = timestamps.min()
+  stride = int(timestamps.max() - base) + 1
+  keys = group * stride + (timestamps - base)
+  targets = np.broadcast_to(boundaries(am0), (len(starts), 5))
+  target_keys = np.arange(len(starts))[:, None] * stride + (targets - base)
+  picks = closest_in_slices(timestamps, keys, starts, ends, targets, target_keys)
+  entries = np.cumsum(counter_increments(entries, timestamps, group, starts, pools))
+  exits = np.cumsum(counter_increments(exits, timestamps, group, starts, pools))
+  return period_counts(entries, exits, picks)
+
+# a day's readings as parallel int64 arrays sorted by station, turnstile and
+# timestamp, turnstile ids are interned into turnstile_codes
+class Readings:
+  def __init__(self, station_ids, turnstile_codes, timestamps, entries, exits, turnstile_ids):
+    self.station_ids = station_ids
+    self.turnstile_codes = turnstile_codes
+    self.timestamps = timestamps
+    self.entries = entries
+    self.exits = exits
+    self.turnstile_ids = turnstile_ids
+
+  # rows of (station_id, turnstile_id, unix_timestamp, entries, exits), when
+  # a timestamp repeats for a turnstile the last row wins
+  @classmethod
+  def from_rows(cls, rows):
+    rows = [tuple(row) for row in rows]
+    if not rows:
+      empty = np.zeros(0, dtype=np.int64)
+      return cls(empty, empty, empty, empty, empty, np.zeros(0, dtype=object))
+    station_ids, turnstile_ids, timestamps, entries, exits = zip(*rows)
+    turnstile_ids, turnstile_codes = np.unique(np.array(turnstile_ids, dtype=object), return_inverse=True)
+    columns = [np.array(c, dtype=np.int64) for c in (station_ids, turnstile_codes, timestamps, entries, exits)]
+    order = np.lexsort((columns[2], columns[1], columns[0]))
+    columns = [c[order] for c in columns]
+    keep = np.ones(len(order), dtype=bool)
+    keep[:-1] = (columns[0][1:] != columns[0][:-1]) | (columns[1][1:] != columns[1][:-1]) | (columns[2][1:] != columns[2][:-1])
+    return cls(*[c[keep] for c in columns], turnstile_ids)
+
+  def __len__(self):
+    return len(self.timestamps)
+
+  # start and end offsets of each turnstile's readings
+  def turnstile_slices(self):
+    changed = (self.station_ids[1:] != self.station_ids[:-1]) | (self.turnstile_codes[1:] != self.turnstile_codes[:-1])
+    starts = np.flatnonzero(np.concatenate(([len(self) > 0], changed)))
+    ends = np.append(starts[1:], len(self))
+    return starts, ends
+
+# {station_id: counts} for a day starting at am0, every turnstile is
+# counted at once by slice_counts and the per turnstile counts are summed
+# per station with a single reduceat. am0 may also be an array of midnights
+# indexed by station_id when the "stations" are really different
+# (station, day) windows
+def day_counts(readings, am0):
+  if len(readings) == 0:
+    return {}
+  starts, ends = readings.turnstile_slices()
+  am0 = np.asarray(am0)
+  if am0.ndim:
+    am0 = am0[readings.station_ids[starts]]
+  station_ids = readings.station_ids[starts]
+  pools = np.unique(station_ids, return_inverse=True)[1]
+  turnstiles = slice_counts(readings.timestamps, readings.entries, readings.exits, starts, ends, am0, pools)
+
+  station_starts = np.flatnonzero(np.concatenate(([True], station_ids[1:] != station_ids[:-1])))
+  totals = np.add.reduceat(turnstiles, station_starts, axis=0)
+  return {station_id: tuple(c) for station_id, c in zip(station_ids[station_starts].tolist(), totals.tolist())}
+
+def read_only_engine(path='mta.db'):
+  return create_engine(f'sqlite:///file:{path}?mode=ro&uri=true')
+
+# readings of a day's window from the table of the day's year
+def read_day(mtadb, date):
+  day_start_unix, day_end_unix = day_window(date)
+  result = mtadb.execute(f'''select station_id, turnstile_id, unix_timestamp, entries, exits from data_{date.year}
+    where unix_timestamp >= {day_start_unix} and unix_timestamp <= {day_end_unix}''')
+  return Readings.from_rows(result)
+
+# read-only connection of a counting worker, set once per process
+_mtadb = None
+
+def _init_worker(path):
+  global _mtadb
+  _mtadb = read_only_engine(path)
+
+def _count_days(days):
+  return [(date, day_counts(read_day(_mtadb, date), midnight(date))) for date in days]
+
+# yields (date, {station_id: counts}) in date order while the days are
+# counted in a process pool, each worker with its own read-only connection.
+# days are handed out in small shards so slow days don't hold up a worker
+def parallel_counts(days, workers=None, path='mta.db', shard_size=7):
+  shards = [days[i:i + shard_size] for i in range(0, len(days), shard_size)]
+  with multiprocessing.Pool(workers, _init_worker, (path,)) as pool:
+    for shard in pool.imap(_count_days, shards):
+      yield from shard
+
+# reads data_{year} once ordered by turnstile and yields each station's
+# {date: counts} for the days of that year between start and end on which
+# it had readings, so only one station is held in memory at a time
+def stream_counts(mtadb, year, start, end):
+  first = max(start, datetime.date(year, 1, 1))
+  last = min(end, datetime.date(year, 12, 31))
+  if first > last:
+    return
+  days = list(day_range(first, last))
+  lows, highs = np.array([day_window(day) for day in days]).T
+  result = mtadb.execution_options(stream_results=True).execute(f'''select station_id, turnstile_id, unix_timestamp, entries, exits
+    from data_{year} order by station_id, turnstile_id, unix_timestamp''')
+  for station_id, station_rows in itertools.groupby(result, key=lambda row: row[0]):
+    # the day windows of every turnstile of the station, counted at once so
+    # a day's windows pool their increments for the outlier cut
+    windows = []
+    offset = 0
+    for turnstile_id, rows in itertools.groupby(station_rows, key=lambda row: row[1]):
+      # later duplicates of a timestamp win, as they did in the day dicts
+      series = {row[2]: (row[3], row[4]) for row in rows}
+      timestamps = np.fromiter(series.keys(), dtype=np.int64, count=len(series))
+      readings = np.array(list(series.values()), dtype=np.int64)
+      los = np.searchsorted(timestamps, lows, 'left')
+      his = np.searchsorted(timestamps, highs, 'right')
+      found = np.flatnonzero(his > los)
+      if len(found) == 0:
+        continue
+      # lay the day windows out back to back, they overlap by the grace period
+      lengths = his[found] - los[found]
+      ends = np.cumsum(lengths)
+      starts = ends - lengths
+      index = np.repeat(los[found] - starts, lengths) + np.arange(ends[-1])
+      windows.append((timestamps[index], readings[index], starts + offset, ends + offset, found))
+      offset += ends[-1]
+    if not windows:
+      yield station_id, {}
+      continue
+    timestamps, readings, starts, ends, found = [np.concatenate(column) for column in zip(*windows)]
+    counted = slice_counts(timestamps, readings[:, 0], readings[:, 1], starts, ends, lows[found] + GRACE, found)
+    totals = np.zeros((len(days), len(COLUMNS)), dtype=np.int64)
+    np.add.at(totals, found, counted)
+    present = np.zeros(len(days), dtype=bool)
+    present[found] = True
+    yield station_id, {days[i]: tuple(totals[i].tolist()) for i in np.flatnonzero(present)}
@@ -0,0 +1,15 @@
+import argparse
+import ingest
+
+parser = argparse.ArgumentParser(description='create the data_{year} indexes on an existing database')
+parser.add_argument('--db', default='mta.db')
+args = parser.parse_args()
+
+mtadb = ingest.get_engine(args.db)
+with mtadb.connect() as conn:
+  for year in ingest.data_years(conn):
+    print(f'indexing data_{year}')
+    # adds file_date to tables loaded before it existed
+    ingest.create_data_table(conn, year)
+    ingest.create_indexes(conn, year)
+  conn.execute('ANALYZE')
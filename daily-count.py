@@ -1,190 +1,90 @@
-import os
-import re
-import csv
-from sqlalchemy import create_engine, insert, table, column
-from sqlalchemy.schema import CreateTable
+import argparse
+from sqlalchemy import create_engine
 import datetime
+import aggregate
+import query_cache
+import arrow_store
+import counts
 
 START_DATE = '01/01/2016'
 END_DATE = '11/26/2021'
 
-# helper function to find closest
-def closest(lst, K):
-  return lst[min(range(len(lst)), key = lambda i: abs(lst[i]-K))]
-
 mtadb=create_engine("sqlite:///mta.db")
-daily=create_engine("sqlite:///mta-daily.db")
-# daily.execute('''
-# CREATE TABLE IF NOT EXISTS station_data (
-# 	id INTEGER PRIMARY KEY,
-#   name TEXT NOT NULL,
-#   lon REAL NOT NULL,
-#   lat REAL NOT NULL,
-#   type TEXT NOT NULL
-# )
-# ''')
-
-# station_table = table("station_data",
-#   column("id"),
-#   column("name"),
-#   column("lon"),
-#   column("lat"),
-#   column("type")
-# )
-
-# with open('turnstile.csv') as file:
-#   data = csv.DictReader(file)
-#   for row in data:
-#     id = row['id']
-#     name = row['name']
-#     lon = row['lon']
-#     lat = row['lat']
-#     t = row['type']
-#     stmt = (
-#       insert(station_table).
-#       values(id=id, name=name, lon=lon, lat=lat, type=t)
-#     )
-#     daily.execute(stmt)
-
-# print('created station_data in daily db')
-
-r_set=daily.execute('select * from station_data ')
-
-#daily count is split into 4 times
-# graveyard - 12 AM to 6 AM (not guaranteed to be within that day)
-# morning - 6 AM to 12 PM
-# afternoon - 12 PM to 6 PM
-# night - 6 PM to 11:59 PM (not guaranteed to be within that day)
-
-stations = []
-for row in r_set:
-  stations.append(row['id'])
-
-# for id in stations:
-#   daily.execute(f'''
-#   CREATE TABLE IF NOT EXISTS count_{id} (
-#     date TEXT PRIMARY KEY,
-#     graveyard_entries INTEGER DEFAULT -1,
-#     morning_entries INTEGER DEFAULT -1,
-#     afternoon_entries INTEGER DEFAULT -1,
-#     night_entries INTEGER DEFAULT -1,
-#     graveyard_exits INTEGER DEFAULT -1,
-#     morning_exits INTEGER DEFAULT -1,
-#     afternoon_exits INTEGER DEFAULT -1,
-#     night_exits INTEGER DEFAULT -1
-#   )
-#   ''')
-
-# keep track of how many rows added
-rows_added = -1
-
-date_start = datetime.datetime.strptime(START_DATE, "%m/%d/%Y")
-date_end = datetime.datetime.strptime(END_DATE, "%m/%d/%Y")
-current_date = date_start
-while current_date <= date_end:
-  next_day = current_date + datetime.timedelta(days=1)
-  print(f'processing data for {current_date}')
-  # get data for that day (with 2 hour grace period on each end)
-  day_start_unix = int(current_date.timestamp()) - 7200
-  day_end_unix = int(next_day.timestamp()) + 7200
-  result = mtadb.execute(f'select * from data_{current_date.year} where unix_timestamp >= {day_start_unix} and unix_timestamp <= {day_end_unix}')
-  # load data for that day into dict
-  turnstiles = {}
-  for row in result:
-    station_id = row['station_id']
-    turnstile_id = row['turnstile_id']
-    timestamp = row['unix_timestamp']
-    entries = row['entries']
-    exits = row['exits']
-    if station_id not in turnstiles:
-      turnstiles[station_id] = {}
-    if turnstile_id not in turnstiles[station_id]:
-      turnstiles[station_id][turnstile_id] = {}
-    if timestamp not in turnstiles[station_id][turnstile_id]:
-      turnstiles[station_id][turnstile_id][timestamp] = {}
-    turnstiles[station_id][turnstile_id][timestamp]['entries'] = entries
-    turnstiles[station_id][turnstile_id][timestamp]['exits'] = exits
-  
-  # go through all stations
-  for id in stations:
-    # default counts
-    graveyard_entries = 0
-    morning_entries = 0
-    afternoon_entries = 0
-    night_entries = 0
-    graveyard_exits = 0
-    morning_exits = 0
-    afternoon_exits = 0
-    night_exits = 0
-    # if id in turnstile data
-    if id in turnstiles:
-      tdata = turnstiles[id]
-      # iterate through every single turnstile
-      for td in tdata:
-        timestamps = list(tdata[td].keys())
-        # get key closest to midnight
-        am0 = current_date.timestamp()
-        am6 = am0 + 21600
-        noon = am6 + 21600
-        pm6 = noon + 21600
-        pm12 = pm6 + 21600
-
-        am0 = closest(timestamps, am0)
-        am6 = closest(timestamps, am6)
-        noon = closest(timestamps, noon)
-        pm6 = closest(timestamps, pm6)
-        pm12 = closest(timestamps, pm12)
-
-        graveyard_entries += tdata[td][am6]['entries'] - tdata[td][am0]['entries']
-        morning_entries += tdata[td][noon]['entries'] - tdata[td][am6]['entries']
-        afternoon_entries += tdata[td][pm6]['entries'] - tdata[td][noon]['entries']
-        night_entries += tdata[td][pm12]['entries'] - tdata[td][pm6]['entries']
-
-        graveyard_exits += tdata[td][am6]['exits'] - tdata[td][am0]['exits']
-        morning_exits += tdata[td][noon]['exits'] - tdata[td][am6]['exits']
-        afternoon_exits += tdata[td][pm6]['exits'] - tdata[td][noon]['exits']
-        night_exits += tdata[td][pm12]['exits'] - tdata[td][pm6]['exits']
-    else:
-      graveyard_entries = -1
-      morning_entries = -1
-      afternoon_entries = -1
-      night_entries = -1
-      graveyard_exits = -1
-      morning_exits = -1
-      afternoon_exits = -1
-      night_exits = -1
-        
-    # insert final count into database
-    data_table = table(f'count_{id}',
-      column("date"),
-      column("graveyard_entries"),
-      column("morning_entries"),
-      column("afternoon_entries"),
-      column("night_entries"),
-      column("graveyard_exits"),
-      column("morning_exits"),
-      column("afternoon_exits"),
-      column("night_exits")
-    )
-
-    stmt = (
-      insert(data_table).
-      values(
-        date=current_date.strftime('%Y/%m/%d'),
-        graveyard_entries=graveyard_entries,
-        morning_entries=morning_entries,
-        afternoon_entries=afternoon_entries,
-        night_entries=night_entries,
-        graveyard_exits=graveyard_exits,
-        morning_exits=morning_exits,
-        afternoon_exits=afternoon_exits,
-        night_exits=night_exits
-      )
-    )
-    daily.execute(stmt)
-    rows_added += 1
-    if rows_added % 250 == 0:
-      print(f'{rows_added + 1} have been inserted to the DB')
-      print(f'Last added info was for station {id} with g+: {graveyard_entries}, m+: {morning_entries}, an+: {afternoon_entries}, n+: {night_entries}, g-: {graveyard_exits}, m-: {morning_exits}, an-: {afternoon_exits}, n-: {night_exits}')
-  # increment day
-  current_date = next_day
\ No newline at end of file
+aggregatedb=aggregate.get_engine()
+
+# counts for every station on one day, -1 when a station had no readings
+def station_rows(stations, date, station_counts):
+  return [(id, date, station_counts.get(id, counts.MISSING)) for id in stations]
+
+def count_by_day(stations, date_start, date_end):
+  # keep track of how many rows added
+  rows_added = 0
+  current_date = date_start
+  while current_date <= date_end:
+    print(f'processing data for {current_date}')
+    # get data for that day (with 2 hour grace period on each end) into columnar arrays
+    readings = counts.read_day(mtadb, current_date)
+    station_counts = counts.day_counts(readings, counts.midnight(current_date))
+    # insert final counts of all stations into database
+    with aggregatedb.begin() as conn:
+      aggregate.write_counts(conn, station_rows(stations, current_date, station_counts))
+    rows_added += len(stations)
+    print(f'{rows_added} have been inserted to the DB')
+    # increment day
+    current_date += datetime.timedelta(days=1)
+
+def count_streaming(stations, date_start, date_end):
+  rows_added = 0
+  for year in range(date_start.year, date_end.year + 1):
+    print(f'streaming data for {year}')
+    days = list(counts.day_range(max(date_start, datetime.date(year, 1, 1)), min(date_end, datetime.date(year, 12, 31))))
+    seen = set()
+    for id, station_counts in counts.stream_counts(mtadb, year, date_start, date_end):
+      if id not in stations:
+        continue
+      seen.add(id)
+      with aggregatedb.begin() as conn:
+        aggregate.write_counts(conn, [(id, day, station_counts.get(day, counts.MISSING)) for day in days])
+      rows_added += len(days)
+      print(f'{rows_added} have been inserted to the DB, last station was {id}')
+    # stations without any readings that year
+    with aggregatedb.begin() as conn:
+      for id in stations:
+        if id not in seen:
+          aggregate.write_counts(conn, [(id, day, counts.MISSING) for day in days])
+
+# days are counted by a pool of read-only workers, this process writes
+def count_parallel(stations, date_start, date_end, workers):
+  days = list(counts.day_range(date_start, date_end))
+  for date, station_counts in counts.parallel_counts(days, workers):
+    with aggregatedb.begin() as conn:
+      aggregate.write_counts(conn, station_rows(stations, date, station_counts))
+    print(f'counted {date}')
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='compute daily period counts for every station')
+  parser.add_argument('--start', default=START_DATE, help='first day (MM/DD/YYYY)')
+  parser.add_argument('--end', default=END_DATE, help='last day (MM/DD/YYYY)')
+  parser.add_argument('--stream', action='store_true', help='read each data_{year} table once instead of querying day by day')
+  parser.add_argument('--workers', type=int, default=None, help='count days in this many processes')
+  args = parser.parse_args()
+
+  #daily count is split into 4 times, see counts.PERIODS
+  aggregate.setup(aggregatedb)
+  stations = aggregate.station_ids(aggregatedb)
+
+  date_start = datetime.datetime.strptime(args.start, "%m/%d/%Y").date()
+  date_end = datetime.datetime.strptime(args.end, "%m/%d/%Y").date()
+  if args.stream:
+    count_streaming(stations, date_start, date_end)
+  elif args.workers:
+    count_parallel(stations, date_start, date_end, args.workers)
+  else:
+    count_by_day(stations, date_start, date_end)
+
+  # bring the dashboard rollups up to date with the new counts
+  with aggregatedb.begin() as conn:
+    aggregate.refresh_rollups(conn, range(date_start.year, date_end.year + 1))
+  # the cache serves the new data version until its export is written
+  print(f'{query_cache.warm(aggregatedb)} dashboard queries cached')
+  arrow_store.export(aggregatedb, range(date_start.year, date_end.year + 1))
@@ -0,0 +1,295 @@
+import threading
+import numpy as np
+import pandas as pd
+import aggregate
+import counts
+import queries
+from query_cache import QueryCache
+
+# period columns of a metric and the names the views give them
+def period_columns(metric):
+  return {f'{period}_{metric.lower()}': period for period in counts.PERIODS}
+
+DAILY_COLUMNS = ['date', 'station_id'] + counts.COLUMNS
+
+# masked rows of a slice are read through np.where when they are at least
+# this share of it, below it gathering them with take is cheaper
+DENSE = 0.25
+
+# what a station map payload holds, the columns pdk.Layer draws from
+MAP_COLUMNS = ['name', 'lon', 'lat', 'total', 'qt', 'red', 'green', 'elevation']
+
+# (view, key, month, metric) of every station map of a year, month 0 maps
+# the whole year
+def map_keys():
+  for metric in queries.METRICS:
+    for system in queries.SYSTEMS:
+      for month in range(13):
+        yield 'system', system, month, metric
+    for line in queries.LINES:
+      yield 'line', line, 0, metric
+
+# a station's color and column height on the maps: stations are ranked by
+# total, shading from green to red through yellow, and rise from the lowest
+def map_columns(totals):
+  qt = totals['total'].rank(pct=True).to_numpy()
+  return totals.assign(
+    qt=qt,
+    red=np.round(np.where(qt <= 0.5, qt * 2 * 255, 255)).astype(np.uint8),
+    green=np.round(np.where(qt <= 0.5, 255, (1 - qt) * 2 * 255)).astype(np.uint8),
+    elevation=totals['total'] - totals['total'].min(),
+  )[MAP_COLUMNS]
+
+# the rows of each (view, key, month, metric) in a table of
+# DashboardData.map_table, a map's rows are contiguous
+def map_ranges(table):
+  keys = table.select(['view', 'key', 'month', 'metric']).to_pandas().astype({'view': str, 'key': str, 'metric': str})
+  starts = np.flatnonzero((keys != keys.shift()).any(axis=1))
+  stops = np.append(starts[1:], len(keys))
+  return {key: (start, stop) for key, start, stop in zip(keys.iloc[starts].itertuples(index=False, name=None), starts, stops)}
+
+# a column of an arrow table as one array. export writes one record batch
+# per file so this is its only chunk, a file of several is combined
+def column_array(table, name):
+  column = table.column(name)
+  return column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+
+def empty_year():
+  year = {column: np.zeros(0, dtype=np.int64) for column in DAILY_COLUMNS}
+  year['date'] = np.zeros(0, dtype='datetime64[s]')
+  return year
+
+# the aggregate database held in memory as columns, loaded once and shared
+# read-only by every session. daily counts are split by year into arrays
+# sorted by date then station, so a month is a contiguous slice and a day's
+# rows are adjacent. views mask a slice to their stations and sum it with
+# reduceat instead of querying sqlite
+class DashboardData:
+  def __init__(self, years, stations, station_lines, maps=None):
+    self.years = years
+    self.stations = stations
+    self.station_lines = station_lines
+    self.map_tables = maps or {}
+    self.map_ranges = {}
+    self.map_payloads = {}
+    self.max_id = int(max([stations['id'].max()] + [year['station_id'].max() for year in years.values()]))
+
+  # fetch runs a query of queries.DASHBOARD_QUERIES and returns its frame
+  @classmethod
+  def load(cls, fetch):
+    daily = fetch(queries.DAILY_COUNTS)
+    daily = daily.assign(date=pd.to_datetime(daily['date'], format='%Y-%m-%d').astype('datetime64[s]'))
+    daily = daily.sort_values(['date', 'station_id'], ignore_index=True)
+    years = {year: {column: rows[column].to_numpy() for column in DAILY_COLUMNS} for year, rows in daily.groupby(daily['date'].dt.year)}
+    stations = fetch(queries.STATIONS).astype({'name': 'category', 'type': 'category'})
+    station_lines = fetch(queries.STATION_LINES).astype({'line': 'category'})
+    return cls(years, stations, station_lines)
+
+  # from the memory mapped files of arrow_store.export, the year arrays are
+  # views of the mapped pages rather than copies
+  @classmethod
+  def from_arrow(cls, directory):
+    import arrow_store
+    years = {}
+    for year in arrow_store.exported_years('daily_count', directory):
+      table = arrow_store.read_table(arrow_store.path('daily_count', year, directory))
+      if table.num_rows:
+        years[year] = {column: column_array(table, column).to_numpy(zero_copy_only=True) for column in DAILY_COLUMNS}
+    stations = arrow_store.read_table(arrow_store.path('station_data', directory=directory)).to_pandas()
+    station_lines = arrow_store.read_table(arrow_store.path('station_line', directory=directory)).to_pandas()
+    maps = {year: arrow_store.read_table(arrow_store.path('station_map', year, directory)) for year in arrow_store.exported_years('station_map', directory)}
+    return cls(years, stations.astype({'name': 'category', 'type': 'category'}), station_lines.astype({'line': 'category'}), maps)
+
+  # the year's arrays with the positions of its rows dated in [start, end)
+  def between(self, year, start, end):
+    columns = self.years.get(year) or empty_year()
+    lo, hi = np.searchsorted(columns['date'], [np.datetime64(start), np.datetime64(end)])
+    return columns, lo, hi
+
+  # (columns, lo, hi, mask, rows) of the rows of the given stations in a
+  # year or month, rows holds their positions when the mask is sparse
+  def year_rows(self, year, station_ids):
+    return self.masked(*self.between(year, f'{year}-01-01', f'{year + 1}-01-01'), station_ids)
+
+  def month_rows(self, year, month, station_ids):
+    month = int(month)
+    end = f'{year + 1}-01-01' if month == 12 else f'{year}-{month + 1:02d}-01'
+    return self.masked(*self.between(year, f'{year}-{month:02d}-01', end), station_ids)
+
+  def masked(self, columns, lo, hi, station_ids):
+    member = np.zeros(self.max_id + 1, dtype=bool)
+    member[np.asarray(station_ids, dtype=np.int64)] = True
+    mask = member[columns['station_id'][lo:hi]]
+    rows = None if mask.sum() >= DENSE * len(mask) and len(mask) else lo + np.flatnonzero(mask)
+    return columns, lo, hi, mask, rows
+
+  # a column over the rows of a selection, the whole slice when it is dense
+  def column(self, selection, name):
+    columns, lo, hi, mask, rows = selection
+    return columns[name][lo:hi] if rows is None else columns[name].take(rows)
+
+  # one array per period of a metric, rows outside a dense mask count 0
+  def period_values(self, selection, metric):
+    mask, rows = selection[3:]
+    values = [self.column(selection, column) for column in period_columns(metric)]
+    return values if rows is not None else [np.where(mask, value, 0) for value in values]
+
+  # per date sums of the periods of a metric over the masked rows, dates
+  # without any of them are left out
+  def daily_series(self, selection, metric):
+    mask, rows = selection[3:]
+    dates = self.column(selection, 'date')
+    starts = np.flatnonzero(np.concatenate(([len(dates) > 0], dates[1:] != dates[:-1])))
+    present = np.add.reduceat(mask, starts) > 0 if rows is None and len(starts) else slice(None)
+    df = pd.DataFrame({'date': dates[starts][present]})
+    for period, values in zip(counts.PERIODS, self.period_values(selection, metric)):
+      df[period] = np.add.reduceat(values, starts)[present] if len(starts) else values
+    return df
+
+  # per station totals of a metric over the masked rows, with the station's
+  # name and position for the maps
+  def station_totals(self, selection, metric):
+    mask, rows = selection[3:]
+    ids = self.column(selection, 'station_id')
+    totals = np.bincount(ids, sum(self.period_values(selection, metric)), self.max_id + 1).astype(np.int64)
+    present = np.bincount(ids, mask if rows is None else None, self.max_id + 1) > 0
+    stations = self.stations[present[self.stations['id'].to_numpy()]]
+    return pd.DataFrame({
+      'id': stations['id'].to_numpy(),
+      'total': totals[stations['id'].to_numpy()],
+      'name': stations['name'].astype(str).to_numpy(),
+      'lon': stations['lon'].to_numpy(),
+      'lat': stations['lat'].to_numpy(),
+    })
+
+  def system_ids(self, system):
+    return self.stations['id'][self.stations['type'] == system].to_numpy()
+
+  def line_ids(self, line):
+    return self.station_lines['station_id'][self.station_lines['line'] == line].to_numpy()
+
+  def station_names(self, system):
+    return self.stations['name'][self.stations['type'] == system].astype(str).tolist()
+
+  def system_table(self, system, year, metric):
+    df = self.daily_series(self.year_rows(year, self.system_ids(system)), metric)
+    df.insert(1, 'weekend', df['date'].dt.dayofweek >= 5)
+    return df
+
+  def system_month_table(self, system, year, month, metric):
+    return self.daily_series(self.month_rows(year, month, self.system_ids(system)), metric)
+
+  def line_table(self, line, year, metric):
+    return self.daily_series(self.year_rows(year, self.line_ids(line)), metric)
+
+  # every station of the name, the same name can have several ids
+  def station_ids(self, name):
+    return self.stations['id'][self.stations['name'] == name].to_numpy()
+
+  def station_table(self, name, year, metric):
+    return self.daily_series(self.year_rows(year, self.station_ids(name)), metric)
+
+  # daily series over several years, a year's slice at a time
+  def years_series(self, years, station_ids, metric):
+    return pd.concat([self.daily_series(self.year_rows(year, station_ids), metric) for year in years], ignore_index=True)
+
+  def system_years_table(self, system, years, metric):
+    return self.years_series(years, self.system_ids(system), metric)
+
+  def line_years_table(self, line, years, metric):
+    return self.years_series(years, self.line_ids(line), metric)
+
+  def station_years_table(self, name, years, metric):
+    return self.years_series(years, self.station_ids(name), metric)
+
+  # station totals of a system's map, or a line's when view is 'line'
+  def map_totals(self, view, key, year, month, metric):
+    station_ids = self.system_ids(key) if view == 'system' else self.line_ids(key)
+    selection = self.month_rows(year, month, station_ids) if month else self.year_rows(year, station_ids)
+    return self.station_totals(selection, metric)
+
+  # every station map of a year in one frame, as arrow_store.export stores
+  # them next to the daily counts
+  def map_table(self, year):
+    frames = [map_columns(self.map_totals(view, key, year, month, metric)).assign(view=view, key=key, month=month, metric=metric) for view, key, month, metric in map_keys()]
+    return pd.concat(frames, ignore_index=True).astype({column: 'category' for column in ['name', 'view', 'key', 'metric']})
+
+  # the records of a station map that pdk.Layer takes as its data, built
+  # once per process. maps of an exported year are sliced from its table,
+  # other maps are computed when first asked for
+  def map_payload(self, view, key, year, month, metric):
+    name = (view, key, year, int(month), metric)
+    if name not in self.map_payloads:
+      if year in self.map_tables:
+        if year not in self.map_ranges:
+          self.map_ranges[year] = map_ranges(self.map_tables[year])
+        start, stop = self.map_ranges[year].get((view, key, int(month), metric), (0, 0))
+        self.map_payloads[name] = self.map_tables[year].slice(start, stop - start).select(MAP_COLUMNS).to_pylist()
+      else:
+        self.map_payloads[name] = map_columns(self.map_totals(*name)).to_dict('records')
+    return self.map_payloads[name]
+
+  # mean daily sum of each period of a metric for {key: (year, station_ids)}
+  # selections, as a frame indexed by key. the rows of a year are matched
+  # against all of its selections at once, a station can be in several, and
+  # each selection's total is divided by the number of days it has rows on
+  def period_means(self, selections, metric):
+    means = pd.DataFrame(index=pd.Index(list(selections)), columns=counts.PERIODS, dtype=float)
+    by_year = {}
+    for i, (year, station_ids) in enumerate(selections.values()):
+      by_year.setdefault(year, []).append((i, station_ids))
+    for year, chosen in by_year.items():
+      columns = self.years.get(year) or empty_year()
+      member = np.zeros((len(chosen), self.max_id + 1), dtype=bool)
+      for j, (i, station_ids) in enumerate(chosen):
+        member[j, np.asarray(station_ids, dtype=np.int64)] = True
+      # positions come grouped by selection and in date order within each
+      which, rows = np.nonzero(member[:, columns['station_id']])
+      dates = columns['date'][rows]
+      first = np.concatenate(([True], (dates[1:] != dates[:-1]) | (which[1:] != which[:-1])))[:len(rows)]
+      present = np.bincount(which[first], minlength=len(chosen))
+      bounds = np.searchsorted(which, np.arange(len(chosen) + 1))
+      targets = [i for i, station_ids in chosen]
+      for period, column in zip(counts.PERIODS, period_columns(metric)):
+        running = np.concatenate(([0], np.cumsum(columns[column][rows])))
+        totals = running[bounds[1:]] - running[bounds[:-1]]
+        means.iloc[targets, means.columns.get_loc(period)] = np.where(present > 0, totals / np.maximum(present, 1), np.nan)
+    return means
+
+# the engine, result cache and data of this process. they live here rather
+# than in app.py because streamlit reruns the app script on every
+# interaction but imports its modules once
+_engine = None
+_cache = None
+_data = None
+_lock = threading.Lock()
+
+def engine():
+  global _engine
+  with _lock:
+    if _engine is None:
+      _engine = aggregate.read_only_engine()
+    return _engine
+
+def pool_stats():
+  return aggregate.pool_stats(engine())
+
+# the data of the current version shared by every session, rerunning the
+# pipeline loads the new version without restarting the app. an arrow
+# export of the same version is memory mapped, so worker processes share
+# its pages, otherwise the frames come from sqlite through the result cache.
+# the version is bumped before the export is written, data loaded from
+# sqlite in between is swapped for the export once it is stamped
+def current_data():
+  global _cache, _data
+  import arrow_store
+  version = aggregate.data_version(engine())
+  exported = arrow_store.exported_version() == version
+  with _lock:
+    if _data is None or _data[0] != version or (exported and not _data[2]):
+      if exported:
+        _data = (version, DashboardData.from_arrow(arrow_store.ARROW_DIR), True)
+      else:
+        _cache = _cache or QueryCache()
+        _data = (version, DashboardData.load(lambda sql: _cache.fetch(_engine, sql, version)), False)
+    return _data[1]
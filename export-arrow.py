@@ -0,0 +1,7 @@
+import aggregate
+import arrow_store
+
+# writes every year of the daily counts and rollups as arrow files for the
+# dashboard to memory map
+aggregatedb = aggregate.get_engine()
+arrow_store.export(aggregatedb, aggregate.daily_years(aggregatedb))
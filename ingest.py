@@ -0,0 +1,273 @@
+import os
+import re
+import csv
+import hashlib
+import datetime
+import multiprocessing
+from zoneinfo import ZoneInfo
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+DATA_DIR = 'mta_data/'
+BATCH_SIZE = 50000
+TIMEZONE = 'America/New_York'
+
+# pragmas applied to the loading connection, a failed load can simply be
+# rerun so we trade durability for speed while inserting
+LOAD_PRAGMAS = {
+  'journal_mode': 'MEMORY',
+  'synchronous': 'OFF',
+  'temp_store': 'MEMORY',
+  'cache_size': -200000,
+}
+
+def get_engine(path='mta.db'):
+  return create_engine(f'sqlite:///{path}')
+
+# file_date is the date of the weekly file a row was loaded from, a file's
+# rows can fall outside its week so reloads delete by it rather than by time
+def create_data_table(conn, year):
+  conn.execute(f'''
+    CREATE TABLE IF NOT EXISTS data_{year} (
+    station_id INTEGER NOT NULL,
+    turnstile_id TEXT NOT NULL,
+    unix_timestamp INTEGER NOT NULL,
+    entries INTEGER NOT NULL,
+    exits INTEGER NOT NULL,
+    file_date INTEGER,
+    FOREIGN KEY(station_id) REFERENCES station_data(id)
+  )
+  ''')
+  columns = [row['name'] for row in conn.execute(f'PRAGMA table_info(data_{year})')]
+  if 'file_date' not in columns:
+    conn.execute(f'ALTER TABLE data_{year} ADD COLUMN file_date INTEGER')
+
+# indexes for the day window reads in daily-count.py, the per turnstile
+# reads of its stream mode and the station day windows count-fixer.py
+# reads, built after a bulk load rather than during it
+def create_indexes(conn, year):
+  conn.execute(f'CREATE INDEX IF NOT EXISTS data_{year}_timestamp ON data_{year} (unix_timestamp)')
+  conn.execute(f'CREATE INDEX IF NOT EXISTS data_{year}_turnstile ON data_{year} (station_id, turnstile_id, unix_timestamp)')
+  conn.execute(f'CREATE INDEX IF NOT EXISTS data_{year}_station ON data_{year} (station_id, unix_timestamp)')
+  conn.execute(f'CREATE INDEX IF NOT EXISTS data_{year}_file ON data_{year} (file_date)')
+
+def drop_indexes(conn, year):
+  conn.execute(f'DROP INDEX IF EXISTS data_{year}_timestamp')
+  conn.execute(f'DROP INDEX IF EXISTS data_{year}_turnstile')
+  conn.execute(f'DROP INDEX IF EXISTS data_{year}_station')
+  conn.execute(f'DROP INDEX IF EXISTS data_{year}_file')
+
+def data_years(conn):
+  result = conn.execute("select name from sqlite_master where type = 'table' and name like 'data\\_%' escape '\\'")
+  return sorted(int(row['name'][5:]) for row in result)
+
+# one row per weekly file loaded into a data_{year} table
+def create_manifest_table(conn):
+  conn.execute('''
+    CREATE TABLE IF NOT EXISTS load_manifest (
+    filename TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    checksum TEXT NOT NULL,
+    rows_loaded INTEGER NOT NULL,
+    min_timestamp INTEGER,
+    max_timestamp INTEGER,
+    loaded_at TEXT NOT NULL,
+    PRIMARY KEY (filename, year)
+  )
+  ''')
+
+def read_manifest(conn):
+  manifest = {}
+  for row in conn.execute('select * from load_manifest'):
+    manifest[(row['filename'], row['year'])] = row
+  return manifest
+
+# map of "STATION-LINENAME" to station id
+def load_stations(mtadb):
+  stations = {}
+  for row in mtadb.execute('select * from station_data '):
+    stations[row['name']] = row['id']
+  with open('lookup.csv') as file:
+    for row in csv.DictReader(file):
+      stations[row['key']] = int(row['id'])
+  return stations
+
+def file_date(filename):
+  return int(re.match('turnstile_([0-9]+).txt', filename)[1])
+
+# a weekly file goes into the table of the year it is dated in. files are
+# dated the saturday after their week, so the one dated january 2nd to 8th
+# holds january 1st, it and any earlier file of the year also go into the
+# previous year's table so the last day of that year has readings past
+# midnight
+def years_for_file(filename):
+  date = file_date(filename)
+  year = 2000 + date // 10000
+  if date % 10000 <= 108:
+    return [year - 1, year]
+  return [year]
+
+# weekly files covering start to end (datetime.date), newest first
+def list_files(start, end):
+  first = int(start.strftime('%y%m%d'))
+  last = int((end + datetime.timedelta(days=7)).strftime('%y%m%d'))
+  filenames = []
+  for filename in os.listdir(DATA_DIR):
+    if first < file_date(filename) <= last:
+      filenames.append(filename)
+  filenames.sort(reverse=True)
+  return filenames
+
+# unix seconds for DATE/TIME columns read as New York local time, during the
+# fall back hour the first (daylight) occurrence is used and times skipped in
+# spring are pushed forward an hour, as datetime.timestamp() does
+def parse_timestamps(dates, times):
+  local = pd.to_datetime(dates + ' ' + times, format="%m/%d/%Y %H:%M:%S")
+  ambiguous = np.ones(len(local), dtype=bool)
+  aware = local.dt.tz_localize(TIMEZONE, ambiguous=ambiguous, nonexistent=pd.Timedelta(hours=1))
+  return (aware - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)
+
+# list of (station_id, turnstile_id, unix_timestamp, entries, exits) rows
+def read_file(filename, stations):
+  data = pd.read_csv(DATA_DIR + filename, dtype=str)
+  data.columns = data.columns.str.strip()
+  names = data['STATION'] + '-' + data['LINENAME']
+  station_ids = names.map(stations)
+  if station_ids.isna().any():
+    raise KeyError(f'unknown stations in {filename}: {sorted(set(names[station_ids.isna()]))}')
+  unix = parse_timestamps(data['DATE'], data['TIME'])
+  return list(zip(
+    station_ids.astype('int64').tolist(),
+    data['SCP'].tolist(),
+    unix.tolist(),
+    data['ENTRIES'].astype('int64').tolist(),
+    data['EXITS'].astype('int64').tolist()
+  ))
+
+def file_checksum(filename):
+  sha = hashlib.sha256()
+  with open(DATA_DIR + filename, 'rb') as file:
+    for chunk in iter(lambda: file.read(1 << 20), b''):
+      sha.update(chunk)
+  return sha.hexdigest()
+
+# station map for the parsing workers, set once per process
+_stations = None
+
+def _init_worker(stations):
+  global _stations
+  _stations = stations
+
+def _file_info(filename):
+  return filename, os.path.getsize(DATA_DIR + filename), file_checksum(filename)
+
+def _parse_file(filename):
+  return filename, read_file(filename, _stations)
+
+def insert_rows(conn, year, filename, rows, batch_size=BATCH_SIZE):
+  stmt = f'insert into data_{year} (station_id, turnstile_id, unix_timestamp, entries, exits, file_date) values (?, ?, ?, ?, ?, ?)'
+  date = file_date(filename)
+  inserted = 0
+  batch = []
+  for row in rows:
+    batch.append(row + (date,))
+    if len(batch) >= batch_size:
+      conn.exec_driver_sql(stmt, batch)
+      inserted += len(batch)
+      batch = []
+  if batch:
+    conn.exec_driver_sql(stmt, batch)
+    inserted += len(batch)
+  return inserted
+
+# drops the rows a previous load of filename put into data_{year}
+def delete_file_rows(conn, year, filename):
+  conn.exec_driver_sql(f'delete from data_{year} where file_date = ?', (file_date(filename),))
+
+# unix range [start, end) of the week a file covers, saturday to friday
+# before the saturday it is dated
+def file_week(filename):
+  end = datetime.datetime.strptime(str(file_date(filename)), '%y%m%d').replace(tzinfo=ZoneInfo(TIMEZONE))
+  start = end - datetime.timedelta(days=7)
+  return int(start.timestamp()), int(end.timestamp())
+
+# drops the untagged rows in a file's week, loaded by the per year scripts
+# before files were tracked, so loading the file into a database built by
+# them replaces its week instead of adding it a second time. a file's out
+# of week rows are left alone as they can be other weeks' readings
+def delete_untagged_rows(conn, year, filename):
+  conn.exec_driver_sql(
+    f'delete from data_{year} where file_date is null and unix_timestamp >= ? and unix_timestamp < ?',
+    file_week(filename)
+  )
+
+def record_file(conn, filename, year, size, checksum, parsed):
+  timestamps = [row[2] for row in parsed]
+  conn.exec_driver_sql(
+    'insert or replace into load_manifest values (?, ?, ?, ?, ?, ?, ?, ?)',
+    (filename, year, size, checksum, len(parsed),
+      min(timestamps, default=None), max(timestamps, default=None),
+      datetime.datetime.now().isoformat(timespec='seconds'))
+  )
+
+# parses files in a process pool while this process is the only writer.
+# a file is written into each of its year tables in one transaction that
+# also removes the rows of any earlier load of it, with incremental set
+# files whose checksum matches the manifest are skipped. before parsing,
+# while the year indexes can serve the deletes, files without a manifest
+# entry clear the untagged rows of their week and a full load deletes the
+# earlier loads of its files. a full load then drops the indexes while
+# inserting, both modes leave them built
+def load_files(mtadb, filenames, stations, years=None, incremental=False, workers=None, batch_size=BATCH_SIZE, pragmas=LOAD_PRAGMAS):
+  rows = 0
+  created = set()
+  with mtadb.connect() as conn, multiprocessing.Pool(workers, _init_worker, (stations,)) as pool:
+    for key, value in pragmas.items():
+      conn.exec_driver_sql(f'PRAGMA {key} = {value}')
+    create_manifest_table(conn)
+    manifest = read_manifest(conn)
+
+    pending = {}
+    for filename, size, checksum in pool.imap_unordered(_file_info, filenames):
+      targets = [year for year in years_for_file(filename) if years is None or year in years]
+      if incremental:
+        targets = [year for year in targets if (filename, year) not in manifest or manifest[(filename, year)]['checksum'] != checksum]
+      if targets:
+        pending[filename] = (size, checksum, targets)
+      else:
+        print("skipping", filename)
+
+    for year in sorted({year for size, checksum, targets in pending.values() for year in targets}):
+      create_data_table(conn, year)
+      create_indexes(conn, year)
+      with conn.begin():
+        for filename, (size, checksum, targets) in pending.items():
+          if year not in targets:
+            continue
+          if (filename, year) not in manifest:
+            delete_untagged_rows(conn, year, filename)
+          elif not incremental:
+            delete_file_rows(conn, year, filename)
+            del manifest[(filename, year)]
+            conn.exec_driver_sql('delete from load_manifest where filename = ? and year = ?', (filename, year))
+      if not incremental:
+        drop_indexes(conn, year)
+      created.add(year)
+
+    for filename, parsed in pool.imap_unordered(_parse_file, list(pending)):
+      print("read", filename)
+      size, checksum, targets = pending[filename]
+      for year in targets:
+        with conn.begin():
+          if (filename, year) in manifest:
+            delete_file_rows(conn, year, filename)
+          rows += insert_rows(conn, year, filename, parsed, batch_size)
+          record_file(conn, filename, year, size, checksum, parsed)
+        print(f'{rows} have been inserted to the DB')
+
+    for year in sorted(created):
+      print(f'indexing data_{year}')
+      create_indexes(conn, year)
+  return rows
@@ -0,0 +1,21 @@
+import argparse
+import datetime
+import ingest
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='load weekly turnstile files into the data_{year} tables')
+  parser.add_argument('--start', default='2016-01-01', help='first day to load (YYYY-MM-DD)')
+  parser.add_argument('--end', default=datetime.date.today().isoformat(), help='last day to load (YYYY-MM-DD)')
+  parser.add_argument('--db', default='mta.db')
+  parser.add_argument('--incremental', action='store_true', help='only load files that are new or changed since the last load')
+  parser.add_argument('--workers', type=int, default=None, help='parsing processes (default: all cores)')
+  parser.add_argument('--batch-size', type=int, default=ingest.BATCH_SIZE)
+  args = parser.parse_args()
+
+  start = datetime.date.fromisoformat(args.start)
+  end = datetime.date.fromisoformat(args.end)
+  mtadb = ingest.get_engine(args.db)
+  stations = ingest.load_stations(mtadb)
+  filenames = ingest.list_files(start, end)
+  years = set(range(start.year, end.year + 1))
+  ingest.load_files(mtadb, filenames, stations, years, args.incremental, args.workers, args.batch_size)
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import counts
+
+# width in pixels the charts are drawn at, streamlit's centered layout, and
+# the fewest pixels a point of a series gets before a coarser resolution is
+# picked
+WIDTH = 700
+PIXELS_PER_POINT = 2
+
+# buckets a resolution groups days into, from days since the epoch. the
+# epoch was a thursday so weeks are shifted to start on monday
+def week_buckets(days):
+  return (days.astype(np.int64) + 3) // 7
+
+def month_buckets(days):
+  return days.astype('datetime64[M]').astype(np.int64)
+
+RESOLUTIONS = {'daily': None, 'weekly': week_buckets, 'monthly': month_buckets}
+
+# the finest resolution whose points fit the width. coarser resolutions
+# keep two points per bucket, so their buckets have to fit twice
+def resolution(dates, width=WIDTH):
+  if len(dates) == 0:
+    return 'daily'
+  days = dates.astype('datetime64[D]')
+  points = width // PIXELS_PER_POINT
+  if len(days) <= points:
+    return 'daily'
+  for name in ['weekly', 'monthly']:
+    buckets = RESOLUTIONS[name](days)
+    if 2 * (buckets[-1] - buckets[0] + 1) <= points:
+      return name
+  return 'monthly'
+
+# a frame of daily_series in long form (date, key, value) for the charts,
+# every day of each period at daily resolution, otherwise the days holding
+# each period's minimum and maximum in a bucket so spikes and dips survive
+# downsampling. every series keeps at most two points a bucket, the budget
+# resolution picks by. dates have to be sorted
+def downsample(df, width=WIDTH):
+  dates = df['date'].to_numpy()
+  name = resolution(dates, width)
+  if name == 'daily':
+    return df.melt(id_vars='date', value_vars=counts.PERIODS, var_name='key')
+  buckets = RESOLUTIONS[name](dates.astype('datetime64[D]'))
+  starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+  ends = np.append(starts[1:], len(buckets)) - 1
+  frames = []
+  for period in counts.PERIODS:
+    values = df[period].to_numpy()
+    # within each bucket rows are ordered by value, so its first and last
+    # rows are where the minimum and maximum are
+    order = np.lexsort((values, buckets))
+    keep = np.union1d(order[starts], order[ends])
+    frames.append(pd.DataFrame({'date': dates[keep], 'key': period, 'value': values[keep]}))
+  return pd.concat(frames, ignore_index=True)
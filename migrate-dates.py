@@ -0,0 +1,12 @@
+import aggregate
+import query_cache
+import arrow_store
+
+aggregatedb = aggregate.get_engine()
+with aggregatedb.begin() as conn:
+  aggregate.create_tables(conn)
+  aggregate.migrate_dates(conn)
+  aggregate.refresh_rollups(conn, aggregate.daily_years(conn))
+# the cache serves the new data version until its export is written
+print(f'{query_cache.warm(aggregatedb)} dashboard queries cached')
+arrow_store.export(aggregatedb, aggregate.daily_years(aggregatedb))
@@ -0,0 +1,21 @@
+import pandas as pd
+
+# options offered by the dashboard's selectboxes
+SYSTEMS = ['NYCT', 'PATH', 'TRAM', 'AIRTRAIN']
+YEARS = [2021, 2020, 2019, 2018, 2017, 2016]
+METRICS = ['Entries', 'Exits']
+LINES = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'J', 'L', 'M', 'N', 'Q', 'R', 'S', 'Z', '1', '2', '3', '4', '5', '6', '7']
+MONTHS = {'01':'January','02':'February','03':'March','04':'April','05':'May','06':'June','07':'July','08':'August','09':'September','10':'October','11':'November','12':'December'}
+
+# the frames the dashboard loads once per data version, every view is
+# computed from them in memory
+DAILY_COUNTS = 'select * from daily_count'
+STATIONS = 'select id, name, lon, lat, type from station_data order by id'
+STATION_LINES = 'select station_id, line from station_line'
+
+def query_frame(engine, sql):
+  cur = engine.execute(sql)
+  return pd.DataFrame(data=cur.fetchall(), columns=cur.keys())
+
+# every query the dashboard runs
+DASHBOARD_QUERIES = [DAILY_COUNTS, STATIONS, STATION_LINES]
@@ -0,0 +1,111 @@
+import time
+import pickle
+import hashlib
+import threading
+from sqlalchemy import create_engine
+from aggregate import data_version, use_wal
+import queries
+
+CACHE_PATH = 'mta-cache.db'
+MAX_BYTES = 512 * 1024 * 1024
+
+# layout doesn't change what a query returns, literals keep their case
+def normalize(sql):
+  return ' '.join(sql.split())
+
+# dataframes of dashboard queries kept on disk across restarts. entries are
+# keyed by the normalized query and only served for the data version they
+# were computed from, the least recently used are evicted past max_bytes
+class QueryCache:
+  def __init__(self, path=CACHE_PATH, max_bytes=MAX_BYTES):
+    self.engine = use_wal(create_engine(f'sqlite:///{path}', connect_args={'check_same_thread': False}))
+    self.max_bytes = max_bytes
+    self.lock = threading.Lock()
+    self.engine.execute('''
+    CREATE TABLE IF NOT EXISTS result_cache (
+      key TEXT PRIMARY KEY,
+      version TEXT NOT NULL,
+      payload BLOB NOT NULL,
+      size INTEGER NOT NULL,
+      last_used REAL NOT NULL
+    )
+    ''')
+    self.engine.execute('CREATE INDEX IF NOT EXISTS result_cache_last_used ON result_cache (last_used)')
+
+  def key(self, sql):
+    return hashlib.sha256(normalize(sql).encode()).hexdigest()
+
+  def get(self, sql, version):
+    key = self.key(sql)
+    with self.lock, self.engine.begin() as conn:
+      row = conn.exec_driver_sql('select version, payload from result_cache where key = ?', (key,)).fetchone()
+      if row is None:
+        return None
+      if row['version'] != version:
+        conn.exec_driver_sql('delete from result_cache where key = ?', (key,))
+        return None
+      conn.exec_driver_sql('update result_cache set last_used = ? where key = ?', (time.time(), key))
+    return pickle.loads(row['payload'])
+
+  # the cached result of sql, run against engine on a miss
+  def fetch(self, engine, sql, version):
+    df = self.get(sql, version)
+    if df is None:
+      df = queries.query_frame(engine, sql)
+      self.put(sql, version, df)
+    return df
+
+  def put(self, sql, version, df):
+    self.store([(sql, df)], version)
+
+  # writes many results in one transaction
+  def store(self, results, version):
+    now = time.time()
+    rows = []
+    for sql, df in results:
+      payload = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+      rows.append((self.key(sql), version, payload, len(payload), now))
+    with self.lock, self.engine.begin() as conn:
+      conn.exec_driver_sql('insert or replace into result_cache values (?, ?, ?, ?, ?)', rows)
+      self.evict(conn, version)
+
+  # keys cached for a version, read without touching their last use
+  def keys(self, version):
+    result = self.engine.execute('select key from result_cache where version = ?', (version,))
+    return {row['key'] for row in result}
+
+  # drops entries of other data versions, then the least recently used
+  # until the cache fits in max_bytes
+  def evict(self, conn, version):
+    conn.exec_driver_sql('delete from result_cache where version != ?', (version,))
+    total = conn.execute('select coalesce(sum(size), 0) from result_cache').scalar()
+    if total <= self.max_bytes:
+      return
+    for key, size in conn.execute('select key, size from result_cache order by last_used').fetchall():
+      conn.exec_driver_sql('delete from result_cache where key = ?', (key,))
+      total -= size
+      if total <= self.max_bytes:
+        break
+
+# runs every dashboard query missing from the cache for the current data
+# version and stores them in batches, returns how many were computed
+def warm(engine, cache=None, batch_size=500):
+  cache = cache or QueryCache()
+  version = data_version(engine)
+  cached = cache.keys(version)
+  computed = 0
+  batch = []
+  for sql in queries.DASHBOARD_QUERIES:
+    key = cache.key(sql)
+    if key in cached:
+      continue
+    cached.add(key)
+    batch.append((sql, queries.query_frame(engine, sql)))
+    if len(batch) >= batch_size:
+      cache.store(batch, version)
+      computed += len(batch)
+      batch = []
+  if batch:
+    cache.store(batch, version)
+    computed += len(batch)
+  return computed
@@ -0,0 +1,20 @@
+import time
+from contextlib import contextmanager
+
+# seconds each startup step took the first time this process ran it.
+# streamlit reruns app.py on every interaction but imports this module once,
+# so later reruns find the step recorded and aren't timed again
+TIMINGS = {}
+
+@contextmanager
+def timed(step):
+  if step in TIMINGS:
+    yield
+    return
+  start = time.perf_counter()
+  yield
+  TIMINGS[step] = time.perf_counter() - start
+
+def report():
+  lines = [f'{step}: {seconds * 1000:.0f} ms' for step, seconds in TIMINGS.items()]
+  return '\n'.join(lines + [f'total: {sum(TIMINGS.values()) * 1000:.0f} ms'])
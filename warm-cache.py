@@ -0,0 +1,7 @@
+import aggregate
+import query_cache
+
+# loads the frames the dashboard is built from into the result cache, run
+# after the pipeline has refreshed the rollups
+aggregatedb = aggregate.get_engine()
+print(f'{query_cache.warm(aggregatedb)} queries cached')